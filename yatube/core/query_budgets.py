@@ -0,0 +1,109 @@
+import re
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.urls import Resolver404, resolve
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def page_size(query_string):
+    """Размер страницы запроса: ?limit= у API, иначе из настроек."""
+    limit = parse_qs(query_string).get('limit')
+    if limit and limit[0].isdigit():
+        return int(limit[0])
+    return settings.NUMBER_OF_POSTS_PER_PAGE
+
+
+def budget_for(url_name, size):
+    """Бюджет из QUERY_BUDGETS: число или {размер страницы: число},
+    где ключ None задаёт бюджет для остальных размеров."""
+    budget = settings.QUERY_BUDGETS.get(url_name)
+    if isinstance(budget, dict):
+        return budget.get(size, budget.get(None))
+    return budget
+
+
+def counted(queries):
+    """Запросы без тех, что описаны в QUERY_BUDGET_IGNORE."""
+    patterns = [re.compile(pattern)
+                for pattern in settings.QUERY_BUDGET_IGNORE]
+    return [query for query in queries
+            if not any(pattern.search(query['sql']) for pattern in patterns)]
+
+
+def check_query_budget(url_name, size, queries):
+    queries = counted(queries)
+    budget = budget_for(url_name, size)
+    if budget is None or len(queries) <= budget:
+        return
+    statements = '\n'.join(
+        f'{number}. {query["sql"]}'
+        for number, query in enumerate(queries, start=1)
+    )
+    raise QueryBudgetExceeded(
+        f'{url_name} (страница {size}): {len(queries)} SQL-запросов '
+        f'при бюджете {budget}\n{statements}'
+    )
+
+
+class QueryBudgetHook:
+    """Считает запросы каждого запроса тестового клиента и сверяет
+    с бюджетом маршрута.
+
+    Тестовый клиент закрывает ответ внутри client.get(), поэтому
+    исключение из request_finished достаётся самому тесту.
+    """
+
+    def __init__(self):
+        self.request = None
+
+    def connect(self):
+        request_started.connect(self.start, dispatch_uid='query_budgets')
+        request_finished.connect(self.finish, dispatch_uid='query_budgets')
+
+    def disconnect(self):
+        request_started.disconnect(dispatch_uid='query_budgets')
+        request_finished.disconnect(dispatch_uid='query_budgets')
+
+    def start(self, environ=None, **kwargs):
+        if environ is None:
+            return
+        try:
+            url_name = resolve(environ['PATH_INFO']).view_name
+        except Resolver404:
+            return
+        self.request = (url_name,
+                        page_size(environ.get('QUERY_STRING', '')),
+                        len(connection.queries_log),
+                        connection.force_debug_cursor)
+        connection.force_debug_cursor = True
+
+    def finish(self, **kwargs):
+        if self.request is None:
+            return
+        url_name, size, start, force_debug_cursor = self.request
+        self.request = None
+        connection.force_debug_cursor = force_debug_cursor
+        check_query_budget(url_name, size,
+                           list(connection.queries_log)[start:])
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """Тестовый прогон, в котором каждая страница держит бюджет
+    SQL-запросов из QUERY_BUDGETS."""
+
+    hook = QueryBudgetHook()
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.hook.connect()
+
+    def teardown_test_environment(self, **kwargs):
+        self.hook.disconnect()
+        super().teardown_test_environment(**kwargs)
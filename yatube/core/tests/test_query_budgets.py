@@ -0,0 +1,170 @@
+import shutil
+import tempfile
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from posts.models import Comment, Follow, Group, Post
+from posts.thumbnails import make_thumbnails
+
+from ..query_budgets import (QueryBudgetExceeded, QueryBudgetHook,
+                             check_query_budget)
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+URLCONFS = ('posts.urls', 'users.urls', 'about.urls')
+PAGE_SIZES = (10, 25)
+PASSWORD = 'Zx9-budget-pass'
+API_ROUTES = {'posts:api_index', 'posts:api_group_posts',
+              'posts:api_profile', 'posts:api_follow_index'}
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x02\x00"
+    b"\x01\x00\x80\x00\x00\x00\x00\x00"
+    b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+    b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+    b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+    b"\x0A\x00\x3B"
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader',
+                                              password=PASSWORD)
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        # у половины постов картинка: миниатюры создаются заранее, как
+        # после фонового пула, и их чтение входит в бюджет страницы
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group,
+                image=(SimpleUploadedFile(f'small{i}.gif', SMALL_GIF)
+                       if i % 2 else None)
+            )
+            for i in range(max(PAGE_SIZES) + 1)
+        ]
+        make_thumbnails(cls.posts[1].image.name)
+        cls.post = cls.posts[-1]
+        cls.comment = Comment.objects.create(post=cls.post,
+                                             author=cls.reader,
+                                             text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def routes(self, size):
+        """(маршрут, клиент, метод, аргументы, данные) для всех страниц;
+        пишущие маршруты проверяются и на POST. Клиенты новые на каждый
+        вызов: последним маршрутом читатель выходит из аккаунта."""
+        post_id = self.post.pk
+        reader = Client()
+        reader.force_login(self.reader)
+        author = Client()
+        author.force_login(self.author)
+        # токен зависит от last_login, поэтому он берётся после входа
+        self.reader.refresh_from_db()
+        uidb64 = urlsafe_base64_encode(force_bytes(self.reader.pk))
+        token = default_token_generator.make_token(self.reader)
+        return [
+            ('posts:index', reader, 'get', [], {}),
+            ('posts:group_posts', reader, 'get', [self.group.slug], {}),
+            ('posts:profile', reader, 'get', [self.author.username], {}),
+            ('posts:post_detail', reader, 'get', [post_id], {}),
+            ('posts:post_create', reader, 'get', [], {}),
+            ('posts:post_create', reader, 'post', [], {'text': 'Новый'}),
+            ('posts:post_edit', author, 'get', [post_id], {}),
+            ('posts:post_edit', author, 'post', [post_id],
+             {'text': 'Правка', 'group': self.group.pk}),
+            ('posts:add_comment', reader, 'post', [post_id],
+             {'text': 'Ответ'}),
+            ('posts:comments_since', reader, 'get', [post_id], {}),
+            ('posts:comments_since', reader, 'get', [post_id],
+             {'since': self.comment.pk}),
+            ('posts:follow_index', reader, 'get', [], {}),
+            ('posts:search', reader, 'get', [], {'q': 'Пост'}),
+            ('posts:export', reader, 'get', [], {}),
+            ('posts:api_index', reader, 'get', [], {}),
+            ('posts:api_group_posts', reader, 'get', [self.group.slug], {}),
+            ('posts:api_profile', reader, 'get', [self.author.username], {}),
+            ('posts:api_follow_index', reader, 'get', [], {}),
+            ('posts:profile_unfollow', reader, 'get',
+             [self.author.username], {}),
+            ('posts:profile_follow', reader, 'get', [self.author.username],
+             {}),
+            ('users:signup', Client(), 'get', [], {}),
+            ('users:signup', Client(), 'post', [],
+             {'username': f'newcomer{size}', 'password1': PASSWORD,
+              'password2': PASSWORD}),
+            ('users:login', Client(), 'get', [], {}),
+            ('users:login', Client(), 'post', [],
+             {'username': 'reader', 'password': PASSWORD}),
+            ('users:password_change', reader, 'get', [], {}),
+            ('users:password_change_done', reader, 'get', [], {}),
+            ('users:password_reset', Client(), 'get', [], {}),
+            ('users:password_reset_done', Client(), 'get', [], {}),
+            ('users:password_reset_confirm', Client(), 'get',
+             [uidb64, token], {}),
+            ('users:password_reset_confirm', Client(), 'get',
+             [uidb64, 'expired-token'], {}),
+            ('users:password_reset_complete', Client(), 'get', [], {}),
+            ('about:author', reader, 'get', [], {}),
+            ('about:tech', reader, 'get', [], {}),
+            ('users:logout', reader, 'get', [], {}),
+        ]
+
+    def test_every_route_has_budget(self):
+        for urlconf in URLCONFS:
+            module = import_module(urlconf)
+            for pattern in module.urlpatterns:
+                name = f'{module.app_name}:{pattern.name}'
+                with self.subTest(name=name):
+                    self.assertIn(name, settings.QUERY_BUDGETS)
+
+    def test_routes_fit_budgets(self):
+        """Число запросов не растёт с размером страницы."""
+        for size in PAGE_SIZES:
+            with override_settings(NUMBER_OF_POSTS_PER_PAGE=size):
+                cache.clear()
+                for name, client, method, args, data in self.routes(size):
+                    if name in API_ROUTES:
+                        data = {**data, 'limit': size}
+                    with self.subTest(name=name, method=method, size=size):
+                        cache.clear()
+                        with CaptureQueriesContext(connection) as queries:
+                            response = getattr(client, method)(
+                                reverse(name, args=args), data
+                            )
+                            if response.streaming:
+                                b''.join(response.streaming_content)
+                        self.assertLess(response.status_code, 400)
+                        check_query_budget(name, size,
+                                           queries.captured_queries)
+
+    @override_settings(QUERY_BUDGETS={'about:author': {None: 0}})
+    def test_exceeded_budget_reports_sql(self):
+        hook = QueryBudgetHook()
+        hook.start(environ={'PATH_INFO': reverse('about:author')})
+        User.objects.exists()
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'SELECT'):
+            hook.finish()
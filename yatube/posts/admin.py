@@ -1,14 +1,123 @@
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 
+from . import counts
 from .models import Group, Post
+from .search import get_backend
+from .versions import get_versions
+
+GROUP_LABEL_KEY = 'posts:admin:group:{pk}:{version}'
+
+
+def group_label_keys(group_ids):
+    version = get_versions(('groups',))
+    return {GROUP_LABEL_KEY.format(pk=pk, version=version): str(pk)
+            for pk in group_ids}
+
+
+def remember_group_labels(groups):
+    """Кладёт в кэш подписи групп, уже прочитанных вместе с постами."""
+    groups = {group.pk: group.title for group in groups}
+    cache.set_many({key: groups[int(pk)]
+                    for key, pk in group_label_keys(groups).items()},
+                   settings.POSTS_COUNT_TIMEOUT)
+
+
+def group_labels(group_ids):
+    """Подписи групп по id; кэш у каждой группы свой и сбрасывается
+    при правке групп. Промахи читаются одним запросом."""
+    keys = group_label_keys(group_ids)
+    cached = cache.get_many(keys)
+    labels = {keys[key]: title for key, title in cached.items()}
+    missing = [pk for key, pk in keys.items() if key not in cached]
+    if missing:
+        found = {str(pk): title for pk, title in Group.objects.filter(
+            pk__in=missing).values_list('pk', 'title')}
+        cache.set_many({key: found[pk] for key, pk in keys.items()
+                        if pk in found}, settings.POSTS_COUNT_TIMEOUT)
+        labels.update(found)
+    return labels
+
+
+class CachedGroupSelect(AutocompleteSelect):
+    """Автодополнение группы, которое берёт подпись выбранной группы
+    из group_labels(), а не отдельным запросом на каждую строку списка."""
+
+    def optgroups(self, name, value, attr=None):
+        labels = group_labels([pk for pk in value if pk])
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        for pk in value:
+            if str(pk) in labels:
+                options.append(self.create_option(
+                    name, pk, labels[str(pk)], True, len(options)
+                ))
+        return [(None, options, 0)]
+
+
+class EstimatedCountPaginator(Paginator):
+    """Число постов в списке без COUNT(*) по всей таблице.
+
+    Без фильтров берётся счётчик из кэша, с фильтрами - точное число
+    до POSTS_COUNT_EXACT_LIMIT, а дальше сам порог.
+    """
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            return counts.all_posts_count()
+        return counts.capped_count(self.object_list)
+
+
+class BoundedChangeList(ChangeList):
+    """Список, который не вытащит всю таблицу, даже если оценка числа
+    постов занижена: без пагинации выдача всё равно ограничена."""
+
+    def get_results(self, request):
+        super().get_results(request)
+        if self.show_all and self.can_show_all:
+            self.result_list = self.result_list[:self.list_max_show_all]
+        elif not self.multi_page:
+            self.result_list = self.result_list[:self.list_per_page]
+        # группы строк уже прочитаны через select_related: их подписи
+        # нужны виджетам list_editable, и запрашивать их снова незачем
+        remember_group_labels({post.group for post in self.result_list
+                               if post.group_id})
 
 
 class PostAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return BoundedChangeList
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'group':
+            kwargs['widget'] = CachedGroupSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using')
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        # ищем по полнотекстовому индексу, а не LIKE по всей таблице
+        if not search_term:
+            return queryset, False
+        return get_backend().filter(queryset, search_term), False
 
 
 class GroupAdmin(admin.ModelAdmin):
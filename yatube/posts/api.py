@@ -0,0 +1,145 @@
+from functools import partial
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import (get_conditional_response, patch_vary_headers,
+                                set_response_etag)
+
+from .decorators import etag_by_versions
+from .feed import FeedPaginator
+from .models import Group, Post, User
+from .storage import post_image_storage
+from .utils import CursorPaginator
+from .views import group_scopes, index_scopes, profile_scopes
+
+FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'image_width': 'image_width',
+    'image_height': 'image_height',
+    'comment_count': 'comment_count',
+}
+# без этих колонок не построить курсор
+CURSOR_COLUMNS = {'id', 'pub_date'}
+JSON_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+def api_index_scopes():
+    return index_scopes() + [('index_comments',)]
+
+
+def api_group_scopes(slug):
+    scopes = group_scopes(slug)
+    if scopes is None:
+        return None
+    group_id = scopes[0][1]
+    return scopes + [('group_comments', group_id)]
+
+
+def api_profile_scopes(username):
+    scopes = profile_scopes(username)
+    if scopes is None:
+        return None
+    author_id = scopes[0][1]
+    return scopes + [('author_comments', author_id)]
+
+
+def error(message, status):
+    return JsonResponse({'error': message}, status=status,
+                        json_dumps_params=JSON_PARAMS)
+
+
+def parse_fields(request):
+    fields = request.GET.get('fields')
+    if not fields:
+        return list(FIELDS)
+    fields = fields.split(',')
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown:
+        raise ValueError('Неизвестные поля: ' + ', '.join(unknown))
+    return fields
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit',
+                                   settings.NUMBER_OF_POSTS_PER_PAGE))
+    except ValueError:
+        size = settings.NUMBER_OF_POSTS_PER_PAGE
+    return max(1, min(size, settings.API_MAX_PAGE_SIZE))
+
+
+def serialize(row, fields):
+    data = {field: row[FIELDS[field]] for field in fields}
+    if data.get('image'):
+        data['image'] = post_image_storage.url(data['image'])
+    elif 'image' in data:
+        data['image'] = None
+    return data
+
+
+def posts_response(request, queryset, paginator_class=CursorPaginator):
+    """Страница ленты в JSON.
+
+    Посты читаются через values(), без создания объектов моделей,
+    пагинация курсорная (after и before), параметр fields ограничивает
+    набор полей, например ?fields=id,text.
+    """
+    try:
+        fields = parse_fields(request)
+    except ValueError as exc:
+        return error(str(exc), 400)
+    columns = CURSOR_COLUMNS.union(FIELDS[field] for field in fields)
+    paginator = paginator_class(queryset.values(*columns),
+                                page_size(request),
+                                after=request.GET.get('after'),
+                                before=request.GET.get('before'))
+    page_obj = paginator.get_page()
+    return JsonResponse({
+        'results': [serialize(row, fields) for row in page_obj],
+        'next': paginator.next_cursor,
+        'previous': paginator.previous_cursor,
+    }, json_dumps_params=JSON_PARAMS)
+
+
+@etag_by_versions(api_index_scopes)
+def index(request):
+    return posts_response(request, Post.objects.all())
+
+
+@etag_by_versions(api_group_scopes)
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return error('Группа не найдена', 404)
+    return posts_response(request, group.posts.all())
+
+
+@etag_by_versions(api_profile_scopes)
+def profile(request, username):
+    author = User.objects.filter(username=username).first()
+    if author is None:
+        return error('Пользователь не найден', 404)
+    return posts_response(request, author.posts.all())
+
+
+def follow_index(request):
+    """Лента подписок зависит от пользователя, поэтому ETag считается
+    по телу ответа: запрос к базе есть, но 304 экономит трафик."""
+    if not request.user.is_authenticated:
+        return error('Нужна авторизация', 401)
+    response = posts_response(
+        request,
+        Post.objects.filter(author__following__user=request.user),
+        partial(FeedPaginator, user=request.user)
+    )
+    patch_vary_headers(response, ('Cookie',))
+    if response.status_code != 200:
+        return response
+    set_response_etag(response)
+    return get_conditional_response(request, etag=response['ETag'],
+                                    response=response)
@@ -0,0 +1,168 @@
+import math
+import platform
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Count
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .importer import Importer
+from .models import AuthorStats, Group, Post
+from .seeding import Seeder
+from .utils import batches
+from .versions import get_versions
+
+TEMPLATE_SIZES = (10, 100, 1000)
+SEED_BATCH_SIZE = 1000
+
+
+def percentile(values, share):
+    """Процентиль по ближайшему рангу: значение из самой выборки."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+def summarize(timings):
+    return {
+        'runs': len(timings),
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+    }
+
+
+def timed(func, repeat, cold):
+    """Вызывает func repeat раз; cold - с пустым кэшем перед каждым
+    вызовом. Возвращает сводку времени, максимум запросов и ответ."""
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            result = func()
+            timings.append(time.perf_counter() - start)
+        queries = max(queries, len(captured))
+    return {**summarize(timings), 'queries': queries}, result
+
+
+def seed_posts(posts, seed):
+    """Добавляет в базу posts постов с пользователями, комментариями
+    и подписками в пропорциях живого сайта."""
+    seeder = Seeder(users=max(posts // 20, 10), groups=10, posts=posts,
+                    comments=posts, follows=posts // 2, seed=seed)
+    importer = Importer(source='seed')
+    for batch in batches(seeder.records(), SEED_BATCH_SIZE):
+        importer.import_batch(batch)
+
+
+def view_targets():
+    """(имя, адрес, пользователь) для страниц самого тяжёлого содержимого:
+    крупнейшей группы, самого плодовитого автора, самого
+    обсуждаемого поста и ленты самого подписанного читателя."""
+    group = Group.objects.annotate(total=Count('posts')).order_by(
+        '-total'
+    ).first()
+    author = AuthorStats.objects.select_related('user').order_by(
+        '-posts_count'
+    ).first().user
+    reader = AuthorStats.objects.select_related('user').order_by(
+        '-following_count'
+    ).first().user
+    post = Post.objects.order_by('-comment_count').first()
+    return [
+        ('index', reverse('posts:index'), None),
+        ('group_posts', reverse('posts:group_posts', args=[group.slug]),
+         None),
+        ('profile', reverse('posts:profile', args=[author.username]), None),
+        ('post_detail', reverse('posts:post_detail', args=[post.pk]), None),
+        ('follow_index', reverse('posts:follow_index'), reader),
+    ]
+
+
+def benchmark_views(repeat):
+    results = {}
+    for name, url, user in view_targets():
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        results[name] = {'url': url}
+        for mode in ('cold', 'warm'):
+            summary, response = timed(lambda: client.get(url), repeat,
+                                      cold=mode == 'cold')
+            summary['status'] = response.status_code
+            summary['bytes'] = len(response.content)
+            results[name][mode] = summary
+    return results
+
+
+def benchmark_templates(repeat):
+    """Отрисовка posts/index.html без представления, с пустым кэшем
+    фрагментов: видно, сколько стоит сам шаблон на N постах."""
+    request = RequestFactory().get(reverse('posts:index'))
+    request.user = AnonymousUser()
+    results = {}
+    for size in TEMPLATE_SIZES:
+        posts = list(Post.objects.select_related('author', 'group').order_by(
+            '-pub_date', '-pk'
+        )[:size])
+        context = {
+            'page_obj': Paginator(posts, size).get_page(1),
+            'cache_version': get_versions(('index',)),
+            'cache_timeout': settings.PAGE_FRAGMENT_TIMEOUT,
+        }
+        summary, html = timed(
+            lambda: render_to_string('posts/index.html', context, request),
+            repeat, cold=True
+        )
+        summary['posts'] = len(posts)
+        summary['bytes'] = len(html.encode())
+        results[str(size)] = summary
+    return results
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes, repeat):
+    """Замеры на наборах данных растущего размера в текущей базе.
+
+    Наборы наращиваются: для следующего размера досеивается разница.
+    """
+    datasets = []
+    seeded = 0
+    for step, size in enumerate(sorted(sizes)):
+        if size > seeded:
+            seed_posts(size - seeded, seed=step)
+            seeded = size
+        datasets.append({
+            'posts': Post.objects.count(),
+            'views': benchmark_views(repeat),
+            'templates': benchmark_templates(repeat),
+        })
+    return {
+        'commit': current_commit(),
+        'created': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'repeat': repeat,
+        'datasets': datasets,
+    }
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Min, Sum
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Post
+
+COUNT_KEY = 'posts:count:{scope}:{pk}'
+
+
+def count_key(scope, pk=''):
+    return COUNT_KEY.format(scope=scope, pk=pk)
+
+
+def estimate_count(queryset):
+    """Оценка сверху по диапазону id: два поиска по индексу вместо скана.
+
+    Годится только для всей таблицы: строки выборки с условием разбросаны
+    по всему диапазону id, и оценка вышла бы близкой к размеру таблицы.
+    """
+    bounds = queryset.order_by().aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['high'] is None:
+        return 0
+    return bounds['high'] - bounds['low'] + 1
+
+
+def capped_count(queryset):
+    """Точное число строк до POSTS_COUNT_EXACT_LIMIT, дальше - оценка
+    для всей таблицы и сам порог для выборки с условием."""
+    limit = settings.POSTS_COUNT_EXACT_LIMIT
+    count = queryset.order_by()[:limit + 1].count()
+    if count <= limit:
+        return count
+    if queryset.query.where:
+        return limit
+    return estimate_count(queryset)
+
+
+def cached_count(key, queryset):
+    count = cache.get(key)
+    if count is not None:
+        return count
+    count = capped_count(queryset)
+    cache.add(key, count, settings.POSTS_COUNT_TIMEOUT)
+    return count
+
+
+def all_posts_count():
+    return cached_count(count_key('all'), Post.objects.all())
+
+
+def group_posts_count(group):
+    return cached_count(count_key('group', group.pk), group.posts.all())
+
+
+def author_posts_count(author):
+    """Число постов автора - точный счётчик из AuthorStats."""
+    return author.stats.posts_count
+
+
+def feed_posts_count(user):
+    """Лента подписок считается суммой счётчиков авторов, без JOIN
+    с постами."""
+    return AuthorStats.objects.filter(
+        user__following__user=user
+    ).aggregate(total=Coalesce(Sum('posts_count'), 0))['total']
+
+
+def post_count_keys(group_id):
+    keys = [count_key('all')]
+    if group_id is not None:
+        keys.append(count_key('group', group_id))
+    return keys
+
+
+def change_counts(keys, delta):
+    for key in keys:
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            # счётчика ещё нет в кэше, он будет посчитан при первом чтении
+            pass
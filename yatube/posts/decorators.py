@@ -0,0 +1,80 @@
+from functools import wraps
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+
+from .versions import get_versions
+
+RESPONSE_KEY = 'posts:response:{etag}'
+
+
+def versions_etag(request, scopes):
+    """ETag страницы: поколения её областей кэша и полный путь запроса."""
+    validator = f'{get_versions(*scopes)}:{request.get_full_path()}'
+    return quote_etag(md5(validator.encode()).hexdigest())
+
+
+def etag_matches(request, etag):
+    return etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+
+
+def etag_by_versions(get_scopes):
+    """Отвечает 304 по ETag из поколений кэша, не вызывая представление.
+
+    В отличие от cache_anonymous_page работает для всех пользователей:
+    подходит для ответов, которые не зависят от того, кто спрашивает.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            scopes = get_scopes(**kwargs)
+            if request.method != 'GET' or scopes is None:
+                return view(request, *args, **kwargs)
+            etag = versions_etag(request, scopes)
+            if etag_matches(request, etag):
+                response = HttpResponseNotModified()
+            else:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_anonymous_page(get_scopes):
+    """Кэширует страницу целиком для анонимов и отвечает 304 по ETag.
+
+    get_scopes получает аргументы представления и возвращает области
+    кэша, от которых зависит страница, или None, если кэшировать нельзя.
+    Авторизованные пользователи всегда получают свежую страницу.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            scopes = get_scopes(**kwargs)
+            if scopes is None:
+                return view(request, *args, **kwargs)
+            etag = versions_etag(request, scopes)
+            if etag_matches(request, etag):
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+            else:
+                key = RESPONSE_KEY.format(etag=etag)
+                response = cache.get(key)
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                    if response.status_code == 200:
+                        response['ETag'] = etag
+                        cache.set(key, response,
+                                  settings.ANONYMOUS_PAGE_TIMEOUT)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
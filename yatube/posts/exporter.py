@@ -0,0 +1,107 @@
+import json
+import zlib
+
+from django.conf import settings
+
+from .images import METADATA_FIELDS
+from .models import Comment, Follow, Group, Post, User
+
+JSON_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+# 16 + MAX_WBITS: zlib пишет заголовок и хвост gzip
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def chunked_rows(queryset, *fields):
+    """Строки values_list по возрастанию pk порциями по EXPORT_CHUNK_SIZE.
+
+    Каждая порция - отдельный запрос с условием pk > последнего, так что
+    в памяти лежит одна порция, сколько бы строк ни было в таблице.
+    """
+    queryset = queryset.order_by('pk').values_list('pk', *fields)
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk)[
+            :settings.EXPORT_CHUNK_SIZE
+        ])
+        if not rows:
+            return
+        for row in rows:
+            yield row[1:]
+        last_pk = rows[-1][0]
+
+
+def account_records(users):
+    rows = chunked_rows(users, 'username', 'first_name', 'last_name',
+                        'email')
+    for username, first_name, last_name, email in rows:
+        yield {'type': 'user', 'username': username,
+               'first_name': first_name, 'last_name': last_name,
+               'email': email}
+
+
+def group_records(groups):
+    for slug, title, description in chunked_rows(groups, 'slug', 'title',
+                                                 'description'):
+        yield {'type': 'group', 'slug': slug, 'title': title,
+               'description': description}
+
+
+def post_records(posts):
+    """Посты с путём картинки в хранилище и её метаданными: сами файлы
+    не выгружаются, при загрузке они уже должны лежать в MEDIA_ROOT."""
+    rows = chunked_rows(posts, 'pk', 'author__username', 'group__slug',
+                        'text', 'pub_date', 'image', *METADATA_FIELDS)
+    for pk, author, group, text, pub_date, image, *metadata in rows:
+        record = {'type': 'post', 'id': pk, 'author': author,
+                  'group': group, 'text': text,
+                  'pub_date': pub_date.isoformat()}
+        if image:
+            record['image'] = image
+            record.update(zip(METADATA_FIELDS, metadata))
+        yield record
+
+
+def comment_records(comments):
+    rows = chunked_rows(comments, 'post_id', 'author__username', 'text',
+                        'created')
+    for post_id, author, text, created in rows:
+        yield {'type': 'comment', 'post': post_id, 'author': author,
+               'text': text, 'created': created.isoformat()}
+
+
+def follow_records(follows):
+    rows = chunked_rows(follows, 'user__username', 'author__username')
+    for user, author in rows:
+        yield {'type': 'follow', 'user': user, 'author': author}
+
+
+def user_records(user):
+    """Посты пользователя и комментарии к ним: сначала все посты,
+    чтобы файл можно было загрузить обратно командой import_posts."""
+    yield from post_records(Post.objects.filter(author=user))
+    yield from comment_records(Comment.objects.filter(post__author=user))
+
+
+def site_records():
+    """Весь сайт в порядке, в котором его читает import_posts: авторы
+    и группы раньше постов, посты раньше комментариев."""
+    yield from account_records(User.objects.all())
+    yield from group_records(Group.objects.all())
+    yield from post_records(Post.objects.all())
+    yield from comment_records(Comment.objects.all())
+    yield from follow_records(Follow.objects.all())
+
+
+def jsonl_lines(records):
+    for record in records:
+        yield json.dumps(record, **JSON_PARAMS) + '\n'
+
+
+def gzip_chunks(lines):
+    """Сжимает строки на лету и отдаёт готовые куски gzip-потока."""
+    compressor = zlib.compressobj(wbits=GZIP_WBITS)
+    for line in lines:
+        data = compressor.compress(line.encode())
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,147 @@
+import heapq
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+
+from .models import AuthorStats, FeedEntry, Follow, Post
+from .utils import CursorPaginator, row_key, seek
+
+
+def pushed_author_ids(author_ids):
+    """Авторы, чьи посты раскладываются по лентам; посты авторов
+    с большим числом подписчиков читаются при запросе.
+
+    Автор, у которого подписчиков стало больше FEED_PUSH_MAX_FOLLOWERS,
+    помечается в AuthorStats и остаётся на чтении при запросе, даже если
+    подписчиков снова стало меньше: иначе отписка раскладывала бы все его
+    посты по лентам всех подписчиков.
+    """
+    stats = {
+        author_id: (followers, pulled)
+        for author_id, followers, pulled in AuthorStats.objects.filter(
+            user_id__in=author_ids
+        ).values_list('user_id', 'followers_count', 'feed_pulled')
+    }
+    pushed, crowded = [], []
+    for author_id in author_ids:
+        followers, pulled = stats.get(author_id, (0, False))
+        if followers > settings.FEED_PUSH_MAX_FOLLOWERS and not pulled:
+            crowded.append(author_id)
+        elif not pulled:
+            pushed.append(author_id)
+    if crowded:
+        AuthorStats.objects.filter(user_id__in=crowded).update(
+            feed_pulled=True
+        )
+    return pushed
+
+
+def pulled_author_ids(user):
+    return list(Follow.objects.filter(
+        user=user, author__stats__feed_pulled=True
+    ).values_list('author_id', flat=True))
+
+
+def _write_entries(entries):
+    entries = iter(entries)
+    batch_size = settings.FEED_BATCH_SIZE
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            break
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост в ленты всех подписчиков автора."""
+    fan_out_posts([post])
+
+
+def fan_out_posts(posts):
+    """То же для пачки постов: подписки всех авторов читаются разом."""
+    by_author = defaultdict(list)
+    for post in posts:
+        by_author[post.author_id].append(post)
+    pushed = pushed_author_ids(by_author)
+    if not pushed:
+        return
+    follows = Follow.objects.filter(author_id__in=pushed).values_list(
+        'user_id', 'author_id'
+    ).iterator()
+    _write_entries(
+        FeedEntry(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for user_id, author_id in follows
+        for post in by_author[author_id]
+    )
+
+
+def follow_author(user_id, author_id):
+    follow_authors([(user_id, author_id)])
+
+
+def follow_authors(pairs):
+    """Дополняет ленты новыми подписками (пользователь, автор) пачкой:
+    посты всех авторов читаются одним запросом."""
+    followers = defaultdict(list)
+    for user_id, author_id in pairs:
+        followers[author_id].append(user_id)
+    pushed = pushed_author_ids(followers)
+    if not pushed:
+        return
+    posts = Post.objects.filter(author_id__in=pushed).order_by().values_list(
+        'author_id', 'pk', 'pub_date'
+    ).iterator()
+    _write_entries(
+        FeedEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for author_id, pk, pub_date in posts
+        for user_id in followers[author_id]
+    )
+
+
+def unfollow_author(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id,
+                             post__author_id=author_id).delete()
+
+
+class FeedPaginator(CursorPaginator):
+    """Курсорная пагинация ленты подписок.
+
+    Посты обычных авторов читаются из материализованной таблицы,
+    посты авторов с большим числом подписчиков - напрямую из Post,
+    все источники сливаются по (pub_date, id).
+    """
+
+    def __init__(self, object_list, per_page, user=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.user = user
+
+    def get_pushed_rows(self, cursor, newer, limit):
+        entries = seek(FeedEntry.objects.filter(user=self.user), cursor,
+                       newer, pk_field='post_id')
+        ids = list(entries.values_list('post_id', flat=True)[:limit])
+        # не in_bulk: object_list может быть и values()-выборкой для API
+        posts = {row_key(post)[1]: post
+                 for post in self.object_list.filter(pk__in=ids)}
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def get_rows(self, cursor, newer, limit):
+        sources = [self.get_pushed_rows(cursor, newer, limit)]
+        pulled = pulled_author_ids(self.user)
+        if pulled:
+            # все авторы на чтении при запросе - одним поиском по ключу
+            posts = self.object_list.filter(author_id__in=pulled)
+            sources.append(list(seek(posts, cursor, newer)[:limit]))
+        merged = heapq.merge(*sources,
+                             key=row_key,
+                             reverse=not newer)
+        rows, seen = [], set()
+        for post in merged:
+            pk = row_key(post)[1]
+            if pk in seen:
+                continue
+            seen.add(pk)
+            rows.append(post)
+            if len(rows) == limit:
+                break
+        return rows
@@ -1,13 +1,36 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 
 from .models import Comment, Post
 
 
 class PostForm(forms.ModelForm):
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # файлы, приём которых оборвал LimitedUploadHandler
+        self.upload_errors = upload_errors or {}
+
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        # ImageField уже открыл картинку, но прочитал только заголовок
+        if isinstance(image, UploadedFile):
+            width, height = image.image.size
+            if width * height > settings.POST_IMAGE_MAX_PIXELS:
+                raise forms.ValidationError(
+                    f'Картинка {width}x{height} слишком большая'
+                )
+        return image
+
+    def clean(self):
+        for field, error in self.upload_errors.items():
+            self.add_error(field, error)
+        return super().clean()
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,73 @@
+import posixpath
+
+from django.utils import timezone
+
+from .models import Post
+from .storage import post_image_storage
+from .utils import batches
+
+
+def walk(storage, path):
+    """Имена файлов под path; в памяти только листинг одного каталога."""
+    if not storage.exists(path):
+        return
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+def old_enough(storage, names, min_age):
+    # свежий файл может принадлежать посту, транзакция которого ещё идёт
+    border = timezone.now() - min_age
+    return [name for name in names
+            if storage.get_modified_time(name) < border]
+
+
+def orphaned_images(batch_size, min_age):
+    """Пачки картинок постов, на которые не ссылается ни один пост."""
+    upload_to = Post._meta.get_field('image').upload_to.rstrip('/')
+    for batch in batches(walk(post_image_storage, upload_to), batch_size):
+        referenced = set(Post.objects.filter(image__in=batch)
+                         .values_list('image', flat=True))
+        yield old_enough(
+            post_image_storage,
+            [name for name in batch if name not in referenced],
+            min_age
+        )
+
+
+def stale_thumbnails(batch_size, min_age):
+    """Пачки миниатюр, о которых не знает хранилище ключей sorl."""
+    from sorl.thumbnail import default
+    from sorl.thumbnail.conf import settings as sorl_settings
+    from sorl.thumbnail.images import ImageFile
+    from sorl.thumbnail.kvstores.base import add_prefix
+    from sorl.thumbnail.models import KVStore
+
+    prefix = sorl_settings.THUMBNAIL_PREFIX.rstrip('/')
+    for batch in batches(walk(default.storage, prefix), batch_size):
+        keys = {add_prefix(ImageFile(name, default.storage).key): name
+                for name in batch}
+        known = set(KVStore.objects.filter(key__in=keys)
+                    .values_list('key', flat=True))
+        yield old_enough(
+            default.storage,
+            [name for key, name in keys.items() if key not in known],
+            min_age
+        )
+
+
+def delete_image(name):
+    """Удаляет картинку, её миниатюры и их записи в хранилище sorl."""
+    from sorl.thumbnail import delete
+    from sorl.thumbnail.images import ImageFile
+
+    delete(ImageFile(name, post_image_storage))
+
+
+def delete_thumbnail(name):
+    from sorl.thumbnail import default
+
+    default.storage.delete(name)
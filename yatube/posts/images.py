@@ -0,0 +1,124 @@
+from base64 import b64encode
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .models import Post
+from .storage import post_image_storage
+
+METADATA_FIELDS = ('image_width', 'image_height', 'image_size',
+                   'image_placeholder')
+EMPTY_METADATA = dict.fromkeys(METADATA_FIELDS[:3], None)
+EMPTY_METADATA['image_placeholder'] = ''
+
+PLACEHOLDER_SIZE = (8, 8)
+# форматы, которые нельзя записать как есть (MPO - JPEG с телефонов)
+SAVE_FORMATS = {'MPO': 'JPEG'}
+
+
+def make_placeholder(image):
+    """Размытая копия картинки в несколько пикселей в виде data URI.
+
+    Браузер растягивает её фоном, пока грузится настоящая картинка.
+    """
+    # JPEG сразу декодируется уменьшенным в 2-8 раз, без полной распаковки
+    image.draft('RGB', (PLACEHOLDER_SIZE[0] * 8, PLACEHOLDER_SIZE[1] * 8))
+    small = image.convert('RGB')
+    small.thumbnail(PLACEHOLDER_SIZE, Image.BOX)
+    buffer = BytesIO()
+    small.save(buffer, 'PNG', optimize=True)
+    return 'data:image/png;base64,' + b64encode(buffer.getvalue()).decode()
+
+
+def header_metadata(file):
+    """Размеры и вес картинки по заголовку, без распаковки пикселей.
+
+    Заглушку позже досчитывает ingest_image в фоновом процессе.
+    """
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+    file.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_size': file.size,
+        'image_placeholder': '',
+    }
+
+
+def image_metadata(file):
+    """Ширина, высота, вес в байтах и заглушка картинки."""
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        placeholder = make_placeholder(image)
+    file.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_size': file.size,
+        'image_placeholder': placeholder,
+    }
+
+
+def read_image_metadata(name):
+    """Метаданные сохранённой картинки или None, если файл не читается."""
+    try:
+        with post_image_storage.open(name) as file:
+            return image_metadata(file)
+    except (OSError, ValueError):
+        return None
+
+
+def reencode(image, image_format):
+    """Картинка, уменьшенная до POST_IMAGE_MAX_SIDE и без EXIF."""
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    image.draft('RGB', (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side))
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    # EXIF не передаётся в save, поэтому в новый файл он не попадает
+    image.save(buffer, image_format, quality=85, optimize=True)
+    return buffer.getvalue()
+
+
+def ingest_image(name):
+    """Приводит загруженную картинку к допустимому виду.
+
+    Слишком большая или несущая EXIF картинка пережимается в новый
+    файл (у него другой хеш), посты переводятся на него, и у них
+    обновляются размеры, вес и заглушка. Оригинал с EXIF удаляется
+    сразу, если на него больше не ссылается ни один пост. Тяжёлая
+    распаковка идёт здесь, в фоновом процессе, а не в запросе.
+    Возвращает итоговое имя.
+    """
+    with post_image_storage.open(name) as file:
+        with Image.open(file) as image:
+            image_format = SAVE_FORMATS.get(image.format, image.format)
+            content = None
+            if (max(image.size) > settings.POST_IMAGE_MAX_SIDE
+                    or image.getexif()):
+                content = reencode(image, image_format)
+    new_name = name
+    if content is not None:
+        new_name = post_image_storage.save(name, ContentFile(content))
+    metadata = read_image_metadata(new_name)
+    if metadata is None:
+        return new_name
+    for post in Post.objects.filter(image=name):
+        post.image = new_name
+        # новый файл обрабатывается здесь же, заказывать его не нужно
+        post._initial_image = new_name
+        for field, value in metadata.items():
+            setattr(post, field, value)
+        post.save(update_fields=('image',) + METADATA_FIELDS)
+    if new_name != name and not Post.objects.filter(image=name).exists():
+        # оригинал с полным размером и EXIF не должен оставаться
+        # доступным по MEDIA_URL до сборки мусора
+        post_image_storage.delete(name)
+    return new_name
@@ -0,0 +1,351 @@
+import csv
+import gzip
+import io
+import json
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .counts import change_counts, post_count_keys
+from .feed import fan_out_posts, follow_authors
+from .images import METADATA_FIELDS
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+from .search import get_backend
+from .stats import change_comment_counts, change_many_author_stats
+from .versions import bump_versions, comment_scopes
+
+RECORD_TYPES = ('user', 'group', 'post', 'comment', 'follow')
+# какие поля записи содержат имена пользователей
+USER_FIELDS = {'post': ('author',), 'comment': ('author',),
+               'follow': ('user', 'author')}
+
+
+def open_source(path):
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path), encoding='utf-8',
+                                newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_jsonl(file, record_type):
+    """Записи по одной на строку; тип берётся из поля type."""
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            yield {'type': None}
+            continue
+        record.setdefault('type', record_type)
+        yield record
+
+
+def read_csv(file, record_type):
+    """В CSV-файле записи одного типа, колонки - поля записи."""
+    for record in csv.DictReader(file):
+        record['type'] = record_type
+        yield record
+
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv}
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(value)
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+@contextmanager
+def original_dates(model, field_name):
+    """Отключает auto_now_add, чтобы сохранить даты из источника."""
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Importer:
+    """Пишет пачки записей через bulk_create.
+
+    Сигналы bulk_create не вызывает, поэтому счётчики, индекс поиска,
+    ленты подписок и поколения кэша обновляются здесь по всей пачке.
+    Пользователи и группы ищутся по словарям в памяти; их размер
+    зависит от числа авторов, а не от длины файла.
+
+    id постов из источника не становятся id в базе: они хранятся
+    в Post.source_id с префиксом source, и комментарии находят свой
+    пост по нему.
+    """
+
+    def __init__(self, create_users=False, source=''):
+        self.create_users = create_users
+        self.source = source
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.users = {}
+        self.imported = Counter()
+        self.skipped = Counter()
+
+    def skip(self, reason):
+        self.skipped[reason] += 1
+
+    def source_key(self, value):
+        if value in (None, ''):
+            return None
+        return f'{self.source}:{value}' if self.source else str(value)
+
+    def import_batch(self, records):
+        by_type = {record_type: [] for record_type in RECORD_TYPES}
+        for record in records:
+            if record.get('type') in by_type:
+                by_type[record['type']].append(record)
+            else:
+                self.skip('invalid')
+        with transaction.atomic():
+            self.import_users(by_type['user'])
+            self.resolve_users({
+                record.get(field)
+                for record_type, fields in USER_FIELDS.items()
+                for record in by_type[record_type]
+                for field in fields
+            })
+            self.import_groups(by_type['group'])
+            self.import_posts(by_type['post'])
+            self.import_comments(by_type['comment'])
+            self.import_follows(by_type['follow'])
+
+    def find_users(self, usernames):
+        """Дополняет словарь id пользователей и возвращает ненайденных."""
+        missing = {name for name in usernames
+                   if name and name not in self.users}
+        if missing:
+            self.users.update(User.objects.filter(
+                username__in=missing
+            ).values_list('username', 'pk'))
+        return missing - self.users.keys()
+
+    def resolve_users(self, usernames):
+        missing = self.find_users(usernames)
+        if missing and self.create_users:
+            self.add_users([User(username=name) for name in sorted(missing)])
+
+    def import_users(self, records):
+        users = {}
+        for record in records:
+            if record.get('username'):
+                users[record['username']] = User(
+                    username=record['username'],
+                    first_name=record.get('first_name') or '',
+                    last_name=record.get('last_name') or '',
+                    email=record.get('email') or '',
+                )
+            else:
+                self.skip('invalid')
+        missing = self.find_users(users)
+        for name in users.keys() - missing:
+            self.skip('duplicate')
+        if missing:
+            self.add_users([user for name, user in users.items()
+                            if name in missing])
+
+    def add_users(self, users):
+        """Создаёт пользователей без пароля вместе со строками счётчиков."""
+        for user in users:
+            user.password = make_password(None)
+        User.objects.bulk_create(users)
+        created = dict(User.objects.filter(
+            username__in=[user.username for user in users]
+        ).values_list('username', 'pk'))
+        AuthorStats.objects.bulk_create([
+            AuthorStats(user_id=pk) for pk in created.values()
+        ])
+        self.users.update(created)
+        self.imported['user'] += len(created)
+        bump_versions(('users',))
+
+    def import_groups(self, records):
+        groups = {}
+        for record in records:
+            slug = record.get('slug')
+            if not slug or not record.get('title'):
+                self.skip('invalid')
+            elif slug in self.groups or slug in groups:
+                self.skip('duplicate')
+            else:
+                groups[slug] = Group(slug=slug, title=record['title'],
+                                     description=record.get('description')
+                                     or '')
+        if not groups:
+            return
+        Group.objects.bulk_create(groups.values())
+        self.groups.update(Group.objects.filter(
+            slug__in=groups
+        ).values_list('slug', 'pk'))
+        bump_versions(('index',), ('groups',))
+        self.imported['group'] += len(groups)
+
+    def build_post(self, record):
+        author_id = self.users.get(record.get('author'))
+        if author_id is None:
+            return self.skip('unknown_user')
+        group_id = None
+        if record.get('group'):
+            group_id = self.groups.get(record['group'])
+            if group_id is None:
+                return self.skip('unknown_group')
+        if not record.get('text'):
+            return self.skip('invalid')
+        # картинка должна уже лежать в хранилище; метаданные без неё
+        # досчитает backfill_image_metadata
+        image = {'image': record.get('image') or ''}
+        if image['image']:
+            image.update((field, record[field]) for field in METADATA_FIELDS
+                         if record.get(field))
+        # у записи без id ключ случайный: по нему после вставки
+        # читается id, который выдала база
+        source_id = (self.source_key(record.get('id'))
+                     or self.source_key(uuid.uuid4().hex))
+        try:
+            return Post(source_id=source_id, author_id=author_id,
+                        group_id=group_id, text=record['text'],
+                        pub_date=parse_date(record.get('pub_date')),
+                        **image)
+        except ValueError:
+            return self.skip('invalid')
+
+    def find_posts(self, source_ids):
+        return dict(Post.objects.filter(source_id__in=source_ids).values_list(
+            'source_id', 'pk'
+        ))
+
+    def import_posts(self, records):
+        posts = [post for post in map(self.build_post, records) if post]
+        # пост с известным source_id импортирован ранее
+        seen = set(self.find_posts([post.source_id for post in posts]))
+        new_posts = []
+        for post in posts:
+            if post.source_id in seen:
+                self.skip('duplicate')
+                continue
+            seen.add(post.source_id)
+            new_posts.append(post)
+        if not new_posts:
+            return
+        with original_dates(Post, 'pub_date'):
+            Post.objects.bulk_create(new_posts)
+        # на SQLite bulk_create не возвращает id, а они нужны индексу
+        # поиска и лентам; id выдаёт база, а не импорт, чтобы не
+        # столкнуться с постами, которые пишутся параллельно
+        pks = self.find_posts([post.source_id for post in new_posts])
+        for post in new_posts:
+            post.pk = pks[post.source_id]
+        keys = Counter()
+        authors = Counter()
+        for post in new_posts:
+            keys.update(post_count_keys(post.group_id))
+            authors[post.author_id] += 1
+        for key, delta in keys.items():
+            change_counts([key], delta)
+        change_many_author_stats('posts_count', authors)
+        get_backend().index_many(new_posts)
+        fan_out_posts(new_posts)
+        bump_versions(
+            ('index',),
+            *(('author', author_id) for author_id in authors),
+            *{('group', post.group_id) for post in new_posts
+              if post.group_id is not None}
+        )
+        self.imported['post'] += len(new_posts)
+
+    def build_comment(self, record):
+        author_id = self.users.get(record.get('author'))
+        if author_id is None:
+            return self.skip('unknown_user')
+        if not record.get('text'):
+            return self.skip('invalid')
+        try:
+            comment = Comment(author_id=author_id, text=record['text'],
+                              created=parse_date(record.get('created')))
+        except ValueError:
+            return self.skip('invalid')
+        comment.source_post = self.source_key(record.get('post'))
+        return comment
+
+    def import_comments(self, records):
+        comments = [comment for comment in map(self.build_comment, records)
+                    if comment]
+        posts = self.find_posts({comment.source_post
+                                 for comment in comments})
+        new_comments = []
+        for comment in comments:
+            if comment.source_post in posts:
+                comment.post_id = posts[comment.source_post]
+                new_comments.append(comment)
+            else:
+                self.skip('unknown_post')
+        if not new_comments:
+            return
+        with original_dates(Comment, 'created'):
+            Comment.objects.bulk_create(new_comments)
+        posts = Counter(comment.post_id for comment in new_comments)
+        change_comment_counts(posts)
+        lists = {
+            scope
+            for author_id, group_id in Post.objects.filter(
+                pk__in=posts
+            ).values_list('author_id', 'group_id')
+            for scope in comment_scopes(author_id, group_id)
+        }
+        bump_versions(*(('post', post_id) for post_id in posts), *lists)
+        self.imported['comment'] += len(new_comments)
+
+    def import_follows(self, records):
+        pairs = []
+        for record in records:
+            user_id = self.users.get(record.get('user'))
+            author_id = self.users.get(record.get('author'))
+            if user_id is None or author_id is None:
+                self.skip('unknown_user')
+            elif user_id == author_id:
+                self.skip('invalid')
+            else:
+                pairs.append((user_id, author_id))
+        seen = set(Follow.objects.filter(
+            user_id__in={user_id for user_id, author_id in pairs},
+            author_id__in={author_id for user_id, author_id in pairs},
+        ).values_list('user_id', 'author_id'))
+        new_pairs = []
+        for pair in pairs:
+            if pair in seen:
+                self.skip('duplicate')
+                continue
+            seen.add(pair)
+            new_pairs.append(pair)
+        if not new_pairs:
+            return
+        Follow.objects.bulk_create([
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in new_pairs
+        ])
+        followers = Counter(author_id for user_id, author_id in new_pairs)
+        following = Counter(user_id for user_id, author_id in new_pairs)
+        change_many_author_stats('followers_count', followers)
+        change_many_author_stats('following_count', following)
+        follow_authors(new_pairs)
+        bump_versions(*(('author', author_id) for author_id in followers))
+        self.imported['follow'] += len(new_pairs)
@@ -0,0 +1,67 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts.images import METADATA_FIELDS, read_image_metadata
+from posts.models import Post
+from posts.thumbnails import make_executor
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры, вес и заглушку картинок у постов, '
+            'загруженных до появления этих полей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько постов обрабатывать за один проход.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Число процессов; 0 - читать картинки в текущем процессе.',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers']:
+            executor = make_executor(options['workers'])
+            read_all = executor.map
+        else:
+            executor = None
+            read_all = map
+        posts = Post.objects.exclude(image='').filter(
+            image_width__isnull=True
+        ).only('pk', 'image').order_by('pk')
+        filled = skipped = 0
+        last_pk = 0
+        try:
+            while True:
+                batch = list(posts.filter(pk__gt=last_pk)
+                             [:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                updated = []
+                names = [post.image.name for post in batch]
+                for post, metadata in zip(batch,
+                                          read_all(read_image_metadata,
+                                                   names)):
+                    if metadata is None:
+                        skipped += 1
+                        continue
+                    for field, value in metadata.items():
+                        setattr(post, field, value)
+                    updated.append(post)
+                Post.objects.bulk_update(updated, METADATA_FIELDS)
+                filled += len(updated)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        self.stdout.write(f'Заполнено постов: {filled}')
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f'Не удалось прочитать картинки: {skipped}'
+            ))
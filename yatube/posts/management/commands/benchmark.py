@@ -0,0 +1,84 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+
+from posts.benchmarks import run_benchmarks
+
+
+def parse_sizes(value):
+    return [int(size) for size in value.split(',')]
+
+
+class Command(BaseCommand):
+    help = ('Замеряет страницы постов и шаблон ленты на засеянных наборах '
+            'данных разного размера во временной тестовой базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=parse_sizes,
+            default=[1000, 10000],
+            help='Размеры наборов в постах через запятую.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Сколько раз запрашивать каждую страницу.',
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для результатов в JSON, чтобы сравнивать коммиты.',
+        )
+        parser.add_argument(
+            '--compare',
+            help='Файл JSON прошлого прогона: напечатать разницу p50.',
+        )
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        setup_test_environment(debug=False)
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = run_benchmarks(options['sizes'], options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+        self.print_results(results, baseline)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+
+    def print_results(self, results, baseline):
+        old = {}
+        for dataset in (baseline or {}).get('datasets', []):
+            for name, view in dataset['views'].items():
+                old[dataset['posts'], name] = view['cold']['p50_ms']
+        for dataset in results['datasets']:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'Постов: {dataset["posts"]}'
+            ))
+            for name, view in dataset['views'].items():
+                cold, warm = view['cold'], view['warm']
+                line = (f'{name:14} p50 {cold["p50_ms"]:8.2f} мс  '
+                        f'p95 {cold["p95_ms"]:8.2f} мс  '
+                        f'запросов {cold["queries"]:3}  '
+                        f'байт {cold["bytes"]:7}  '
+                        f'из кэша p50 {warm["p50_ms"]:8.2f} мс')
+                if (dataset['posts'], name) in old:
+                    before = old[dataset['posts'], name]
+                    line += f'  было {before:8.2f} мс'
+                self.stdout.write(line)
+            for size, render in dataset['templates'].items():
+                self.stdout.write(
+                    f'index.html x{size:5} p50 {render["p50_ms"]:8.2f} мс  '
+                    f'p95 {render["p95_ms"]:8.2f} мс  '
+                    f'байт {render["bytes"]:8}'
+                )
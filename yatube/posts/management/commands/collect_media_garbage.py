@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from posts.garbage import (delete_image, delete_thumbnail, orphaned_images,
+                           stale_thumbnails)
+from posts.storage import post_image_storage
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки, на которые не ссылается ни один пост, '
+            'и миниатюры, потерянные хранилищем sorl.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько файлов сверять с базой одним запросом.',
+        )
+        parser.add_argument(
+            '--min-age-hours',
+            type=int,
+            default=24,
+            help='Не трогать файлы моложе этого возраста.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что было бы удалено.',
+        )
+
+    def collect(self, batches, storage, delete, dry_run):
+        count = size = 0
+        for batch in batches:
+            for name in batch:
+                size += storage.size(name)
+                if dry_run:
+                    self.stdout.write(name)
+                else:
+                    delete(name)
+            count += len(batch)
+        return count, size
+
+    def handle(self, *args, **options):
+        from sorl.thumbnail import default
+
+        batch_size = options['batch_size']
+        min_age = timedelta(hours=options['min_age_hours'])
+        dry_run = options['dry_run']
+        # сначала картинки: вместе с ними уходят и их миниатюры
+        count, size = self.collect(
+            orphaned_images(batch_size, min_age), post_image_storage,
+            delete_image, dry_run
+        )
+        self.stdout.write(
+            f'Картинок без постов: {count} ({filesizeformat(size)})'
+        )
+        count, size = self.collect(
+            stale_thumbnails(batch_size, min_age), default.storage,
+            delete_thumbnail, dry_run
+        )
+        self.stdout.write(
+            f'Потерянных миниатюр: {count} ({filesizeformat(size)})'
+        )
+        if not dry_run:
+            self.stdout.write(self.style.SUCCESS('Мусор удалён'))
@@ -0,0 +1,83 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import Comment, FeedEntry, Follow, Group, Post, User
+from posts.utils import seek
+
+SORT_PATTERN = re.compile(r'TEMP B-TREE|\bSort\b', re.IGNORECASE)
+
+
+def first_pk(model):
+    return model.objects.order_by('pk').values_list('pk', flat=True).first()
+
+
+class Command(BaseCommand):
+    help = ('Печатает планы запросов списочных страниц и ищет '
+            'сортировки во временном B-дереве.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Завершиться с ошибкой, если запрос основного (курсорного) '
+                 'пути сортирует без индекса.',
+        )
+
+    def get_queries(self):
+        """Возвращает {имя: (queryset, устаревший ли это путь ?page=N)}."""
+        limit = settings.NUMBER_OF_POSTS_PER_PAGE + 1
+        user_id = first_pk(User) or 0
+        group_id = first_pk(Group) or 0
+        post_id = first_pk(Post) or 0
+        posts = Post.objects.select_related('group', 'author')
+        return {
+            'index': (seek(posts, None, False)[:limit], False),
+            'index ?page=N': (posts[limit * 10:limit * 11], True),
+            'group_posts': (
+                seek(posts.filter(group_id=group_id), None, False)[:limit],
+                False
+            ),
+            'profile': (
+                seek(posts.filter(author_id=user_id), None, False)[:limit],
+                False
+            ),
+            'profile following': (
+                Follow.objects.filter(author_id=user_id, user_id=user_id),
+                False
+            ),
+            'follow_index': (
+                seek(FeedEntry.objects.filter(user_id=user_id), None, False,
+                     pk_field='post_id')
+                .values_list('post_id', flat=True)[:limit],
+                False
+            ),
+            'follow_index ?page=N': (
+                posts.filter(
+                    author__following__user_id=user_id
+                )[limit * 10:limit * 11],
+                True
+            ),
+            'post_detail comments': (
+                Comment.objects.filter(post_id=post_id)
+                .select_related('author'),
+                False
+            ),
+        }
+
+    def handle(self, *args, **options):
+        sorted_views = []
+        for name, (queryset, legacy) in self.get_queries().items():
+            plan = queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+            if SORT_PATTERN.search(plan):
+                self.stdout.write(self.style.WARNING('сортировка без индекса'))
+                if not legacy:
+                    sorted_views.append(name)
+            self.stdout.write('')
+        if sorted_views and options['check']:
+            raise CommandError(
+                'Сортировка без индекса: ' + ', '.join(sorted_views)
+            )
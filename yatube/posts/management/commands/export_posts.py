@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.exporter import (gzip_chunks, jsonl_lines, site_records,
+                            user_records)
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки в '
+            'gzip-файл JSONL, который читает команда import_posts.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Куда записать файл .jsonl.gz.')
+        parser.add_argument(
+            '--user',
+            help='Выгрузить только посты этого пользователя с комментариями.',
+        )
+
+    def handle(self, *args, **options):
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(
+                    f'Пользователь {options["user"]} не найден'
+                )
+            records = user_records(user)
+        else:
+            records = site_records()
+        with open(options['path'], 'wb') as file:
+            for chunk in gzip_chunks(jsonl_lines(records)):
+                file.write(chunk)
+        self.stdout.write(f'Выгрузка записана в {options["path"]}')
@@ -0,0 +1,96 @@
+import json
+import os
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.importer import READERS, RECORD_TYPES, Importer, open_source
+from posts.utils import batches
+
+
+def read_checkpoint(checkpoint, path):
+    if not checkpoint or not os.path.exists(checkpoint):
+        return 0
+    with open(checkpoint) as file:
+        state = json.load(file)
+    if state['source'] != path:
+        raise CommandError(
+            f'Контрольная точка {checkpoint} записана для {state["source"]}'
+        )
+    return state['records']
+
+
+def write_checkpoint(checkpoint, path, records):
+    # сначала временный файл: оборванная запись не портит прежнюю точку
+    temporary = f'{checkpoint}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump({'source': path, 'records': records}, file)
+    os.replace(temporary, checkpoint)
+
+
+class Command(BaseCommand):
+    help = ('Импортирует группы, посты, комментарии и подписки из JSONL '
+            'или CSV потоком, пачками в отдельных транзакциях.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .jsonl или .csv, можно .gz.')
+        parser.add_argument(
+            '--format',
+            choices=sorted(READERS),
+            help='Формат файла; по умолчанию определяется по расширению.',
+        )
+        parser.add_argument(
+            '--type',
+            choices=RECORD_TYPES,
+            default='post',
+            help='Тип записей CSV и записей JSONL без поля type.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько записей писать в одной транзакции.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл, где хранится число обработанных записей; '
+                 'повторный запуск продолжит с места остановки.',
+        )
+        parser.add_argument(
+            '--source',
+            default='',
+            help='Имя источника: одинаковые id постов из разных '
+                 'источников не считаются дубликатами.',
+        )
+        parser.add_argument(
+            '--create-users',
+            action='store_true',
+            help='Создавать неизвестных пользователей без пароля.',
+        )
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        checkpoint = options['checkpoint']
+        data_format = options['format']
+        if data_format is None:
+            data_format = ('csv' if path.endswith(('.csv', '.csv.gz'))
+                           else 'jsonl')
+        done = read_checkpoint(checkpoint, path)
+        importer = Importer(create_users=options['create_users'],
+                            source=options['source'])
+        with open_source(path) as file:
+            records = islice(READERS[data_format](file, options['type']),
+                             done, None)
+            for batch in batches(records, options['batch_size']):
+                importer.import_batch(batch)
+                done += len(batch)
+                if checkpoint:
+                    write_checkpoint(checkpoint, path, done)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'Обработано записей: {done}')
+        for name, count in sorted(importer.imported.items()):
+            self.stdout.write(f'Импортировано {name}: {count}')
+        for reason, count in sorted(importer.skipped.items()):
+            self.stdout.write(
+                self.style.WARNING(f'Пропущено ({reason}): {count}')
+            )
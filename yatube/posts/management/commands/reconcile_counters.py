@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from posts.stats import (author_stats_drift, comment_count_drift,
+                         reconcile_author_stats, reconcile_comment_counts)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счётчики постов, '
+            'подписчиков и комментариев.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Сколько строк пересчитывать одним UPDATE.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, сколько строк разошлось.',
+        )
+
+    def handle(self, *args, **options):
+        stats_drift = author_stats_drift().count()
+        comments_drift = comment_count_drift().count()
+        self.stdout.write(f'Расхождений в статистике авторов: {stats_drift}')
+        self.stdout.write(
+            f'Расхождений в числе комментариев: {comments_drift}'
+        )
+        if options['dry_run']:
+            return
+        reconcile_author_stats(options['batch_size'])
+        reconcile_comment_counts(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
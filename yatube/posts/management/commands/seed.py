@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+
+from posts.importer import Importer
+from posts.seeding import Seeder
+from posts.utils import batches
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу пользователями, группами, постами, '
+            'комментариями и подписками в объёмах, близких к боевым.')
+
+    def add_arguments(self, parser):
+        for name, default in (('users', 1000), ('groups', 20),
+                              ('posts', 10000), ('comments', 20000),
+                              ('follows', 10000)):
+            parser.add_argument(
+                f'--{name}',
+                type=int,
+                default=default,
+                help=f'Сколько создать ({default} по умолчанию).',
+            )
+        parser.add_argument(
+            '--image-ratio',
+            type=float,
+            default=0,
+            help='Доля постов с картинкой, от 0 до 1.',
+        )
+        parser.add_argument(
+            '--images',
+            type=int,
+            default=20,
+            help='Сколько разных картинок сгенерировать для постов.',
+        )
+        parser.add_argument(
+            '--exponent',
+            type=float,
+            default=1.0,
+            help='Показатель степенного закона для авторов постов, '
+                 'подписок и групп: чем больше, тем сильнее перекос.',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='За сколько последних дней распределить посты.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Зерно генератора: одно и то же зерно - одни и те же данные.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько записей писать в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        seeder = Seeder(
+            options['users'], options['groups'], options['posts'],
+            options['comments'], options['follows'],
+            image_ratio=options['image_ratio'], images=options['images'],
+            exponent=options['exponent'], days=options['days'],
+            seed=options['seed'],
+        )
+        importer = Importer(source='seed')
+        done = 0
+        for batch in batches(seeder.records(), options['batch_size']):
+            importer.import_batch(batch)
+            done += len(batch)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Записано записей: {done}')
+        for name, count in sorted(importer.imported.items()):
+            self.stdout.write(f'Создано {name}: {count}')
+        for reason, count in sorted(importer.skipped.items()):
+            self.stdout.write(
+                self.style.WARNING(f'Пропущено ({reason}): {count}')
+            )
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='source_id',
+            field=models.CharField(editable=False, max_length=255, null=True, unique=True, verbose_name='Идентификатор в источнике'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled_authors(apps, schema_editor):
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    AuthorStats.objects.filter(
+        followers_count__gt=settings.FEED_PUSH_MAX_FOLLOWERS
+    ).update(feed_pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_source_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='feed_pulled',
+            field=models.BooleanField(default=False, verbose_name='Посты читаются при запросе ленты'),
+        ),
+        migrations.RunPython(mark_pulled_authors, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import post_image_storage
+
 User = get_user_model()
 
 
@@ -38,14 +40,34 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=post_image_storage,
         blank=True,
         help_text='Загрузить картинку'
     )
+    comment_count = models.IntegerField('Комментариев', default=0,
+                                        editable=False)
+    image_width = models.PositiveIntegerField('Ширина картинки', null=True,
+                                              editable=False)
+    image_height = models.PositiveIntegerField('Высота картинки', null=True,
+                                               editable=False)
+    image_size = models.PositiveIntegerField('Размер картинки, байт',
+                                             null=True, editable=False)
+    image_placeholder = models.TextField('Заглушка картинки', blank=True,
+                                         editable=False)
+    source_id = models.CharField('Идентификатор в источнике',
+                                 max_length=255, unique=True, null=True,
+                                 editable=False)
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['author', 'pub_date'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', 'pub_date'],
+                         name='post_group_date_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
@@ -73,6 +95,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['created']
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -89,3 +115,52 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_feed_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'pub_date', 'post'],
+                         name='feed_entry_user_date_idx'),
+        ]
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.IntegerField('Постов', default=0)
+    followers_count = models.IntegerField('Подписчиков', default=0)
+    following_count = models.IntegerField('Подписок', default=0)
+    # посты автора подмешиваются в ленты при чтении, а не раскладываются
+    feed_pulled = models.BooleanField('Посты читаются при запросе ленты',
+                                      default=False)
+
+    def __str__(self):
+        return str(self.user_id)
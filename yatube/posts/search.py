@@ -0,0 +1,180 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+
+from .models import Post
+
+TERM_PATTERN = re.compile(r'\w+')
+# служебные символы, которыми FTS5 обрамляет совпадения в snippet()
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def highlight(snippet):
+    """Экранирует текст поста и превращает метки совпадений в <mark>."""
+    html = escape(snippet).replace(MARK_START, '<mark>')
+    return mark_safe(html.replace(MARK_END, '</mark>'))
+
+
+class SearchResults:
+    """Ленивая выдача поиска: срез - один запрос к индексу и один за
+    постами, len() - подсчёт совпадений. Подходит для Paginator."""
+
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.query = query
+
+    def __len__(self):
+        return self.backend.count(self.query)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        offset = item.start or 0
+        limit = item.stop - offset
+        hits = self.backend.hits(self.query, limit, offset)
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for pk, snippet in hits]
+        )
+        results = []
+        for pk, snippet in hits:
+            # пост мог быть удалён между запросами
+            if pk in posts:
+                posts[pk].snippet = snippet
+                results.append(posts[pk])
+        return results
+
+
+class SearchBackend:
+    """Интерфейс поискового индекса постов."""
+
+    def index(self, post):
+        pass
+
+    def index_many(self, posts):
+        for post in posts:
+            self.index(post)
+
+    def remove(self, post_id):
+        pass
+
+    def filter(self, queryset, query):
+        raise NotImplementedError
+
+    def count(self, query):
+        raise NotImplementedError
+
+    def hits(self, query, limit, offset):
+        """Список (id поста, html-фрагмент) в порядке релевантности."""
+        raise NotImplementedError
+
+    def search(self, query):
+        return SearchResults(self, query)
+
+
+class ContainsBackend(SearchBackend):
+    """Поиск без индекса через LIKE: для баз без полнотекстового поиска."""
+
+    def filter(self, queryset, query):
+        return queryset.filter(text__icontains=query)
+
+    def count(self, query):
+        return self.filter(Post.objects.all(), query).count()
+
+    def hits(self, query, limit, offset):
+        posts = self.filter(Post.objects.all(), query).values_list(
+            'pk', 'text')[offset:offset + limit]
+        return [(pk, escape(Truncator(text).words(30)))
+                for pk, text in posts]
+
+
+class SqliteFtsBackend(SearchBackend):
+    """Инвертированный индекс на SQLite FTS5.
+
+    Таблица posts_post_fts создаётся миграцией, rowid строки индекса
+    равен id поста. Ранжирование - встроенный bm25 (колонка rank).
+    """
+
+    table = 'posts_post_fts'
+
+    def match(self, query):
+        """Запрос пользователя в синтаксисе FTS5: каждое слово берётся
+        в кавычки и ищется по префиксу, слова объединяются через AND."""
+        terms = TERM_PATTERN.findall(query)
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s',
+                           [post.pk])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)',
+                [post.pk, post.text]
+            )
+
+    def index_many(self, posts):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s',
+                               [[post.pk] for post in posts])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)',
+                [[post.pk, post.text] for post in posts]
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s',
+                           [post_id])
+
+    def filter(self, queryset, query):
+        match = self.match(query)
+        if not match:
+            return queryset.none()
+        # не pk__in=RawSQL(...): Django берёт подзапрос во вторые скобки,
+        # и SQLite читает "IN ((SELECT ...))" как скалярный подзапрос,
+        # который отдаёт только первое совпадение
+        meta = queryset.model._meta
+        return queryset.extra(
+            where=[f'"{meta.db_table}"."{meta.pk.column}" IN '
+                   f'(SELECT rowid FROM {self.table} '
+                   f'WHERE {self.table} MATCH %s)'],
+            params=[match],
+        )
+
+    def count(self, query):
+        match = self.match(query)
+        if not match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {self.table} '
+                f'WHERE {self.table} MATCH %s', [match]
+            )
+            return cursor.fetchone()[0]
+
+    def hits(self, query, limit, offset):
+        match = self.match(query)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({self.table}, 0, %s, %s, '…', 16) "
+                f'FROM {self.table} WHERE {self.table} MATCH %s '
+                f'ORDER BY rank LIMIT %s OFFSET %s',
+                [MARK_START, MARK_END, match, limit, offset]
+            )
+            return [(pk, highlight(snippet)) for pk, snippet in cursor]
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.POSTS_SEARCH_BACKEND)()
+    return _backend
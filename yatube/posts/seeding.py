@@ -0,0 +1,183 @@
+import random
+from datetime import timedelta
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image, ImageDraw
+
+from .images import read_image_metadata
+from .models import Post
+from .storage import post_image_storage
+
+IMAGE_SIZE = (1600, 1200)
+# доля постов без группы, как у живых пользователей
+UNGROUPED_RATIO = 0.3
+# простое число: умножение на него по модулю переставляет номера
+SCATTER_PRIME = 2147483647
+
+
+def power_law_index(rng, size, exponent):
+    """Номер от 0 до size - 1 с вероятностью ~ 1 / (номер + 1) ** exponent.
+
+    Обратное преобразование непрерывного степенного распределения:
+    первые номера выпадают очень часто, длинный хвост - редко.
+    """
+    top = size + 1
+    if exponent == 1:
+        value = top ** rng.random()
+    else:
+        power = 1 - exponent
+        value = ((top ** power - 1) * rng.random() + 1) ** (1 / power)
+    return min(int(value), size) - 1
+
+
+def scatter(index, size):
+    """Взаимно однозначно переставляет номера от 0 до size - 1.
+
+    Самые плодовитые авторы не совпадают с самыми читаемыми, иначе
+    их посты, помноженные на подписчиков, раздувают таблицу лент.
+    """
+    return (index + 1) * SCATTER_PRIME % size
+
+
+def username(index):
+    return f'user{index}'
+
+
+def group_slug(index):
+    return f'group-{index}'
+
+
+class Seeder:
+    """Поток записей для Importer с данными "как в проде".
+
+    Авторы постов и подписок выбираются по степенному закону: у немногих
+    авторов большая часть постов и подписчиков. Один и тот же seed даёт
+    те же записи; имена пользователей и групп выводятся из номера, чтобы
+    не держать их списки в памяти.
+    """
+
+    def __init__(self, users, groups, posts, comments, follows,
+                 image_ratio=0, images=20, exponent=1.0, days=365, seed=0,
+                 until=None):
+        self.users = users
+        self.groups = groups
+        self.posts = posts
+        self.comments = comments
+        self.follows = follows
+        self.image_ratio = image_ratio
+        self.images = images
+        self.exponent = exponent
+        self.rng = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        # начало текущих суток: в течение дня seed даёт те же даты
+        self.until = until or timezone.now().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        self.since = self.until - timedelta(days=days)
+        # id постов в потоке продолжают id базы: повторный запуск
+        # добавляет новые посты, а не пропускает их как дубликаты
+        self.first_post_id = (
+            Post.objects.aggregate(top=Max('pk'))['top'] or 0
+        ) + 1
+
+    def records(self):
+        yield from self.user_records()
+        yield from self.group_records()
+        # подписки раньше постов: новые посты раскладываются по лентам
+        # одним запросом на пачку, а не дозаливкой на каждую подписку
+        yield from self.follow_records()
+        yield from self.post_records()
+        yield from self.comment_records()
+
+    def user_records(self):
+        for index in range(self.users):
+            yield {'type': 'user', 'username': username(index),
+                   'first_name': self.fake.first_name(),
+                   'last_name': self.fake.last_name(),
+                   'email': self.fake.email()}
+
+    def group_records(self):
+        for index in range(self.groups):
+            yield {'type': 'group', 'slug': group_slug(index),
+                   'title': self.fake.sentence(nb_words=3).rstrip('.'),
+                   'description': self.fake.paragraph()}
+
+    def follow_records(self):
+        if self.users < 2:
+            return
+        for _ in range(self.follows):
+            yield {
+                'type': 'follow',
+                'user': username(self.rng.randrange(self.users)),
+                'author': username(power_law_index(self.rng, self.users,
+                                                   self.exponent)),
+            }
+
+    def post_date(self, index):
+        # посты идут по дате, поэтому и id в базе растут вместе с ней
+        return self.since + (self.until - self.since) * index / self.posts
+
+    def post_records(self):
+        if not self.users:
+            return
+        images = self.make_images() if self.image_ratio else []
+        for index in range(self.posts):
+            record = {
+                'type': 'post',
+                'id': self.first_post_id + index,
+                'author': username(scatter(
+                    power_law_index(self.rng, self.users, self.exponent),
+                    self.users
+                )),
+                'text': self.fake.paragraph(
+                    nb_sentences=self.rng.randint(1, 6)
+                ),
+                'pub_date': self.post_date(index).isoformat(),
+            }
+            if self.groups and self.rng.random() > UNGROUPED_RATIO:
+                record['group'] = group_slug(power_law_index(
+                    self.rng, self.groups, self.exponent
+                ))
+            if images and self.rng.random() < self.image_ratio:
+                record.update(self.rng.choice(images))
+            yield record
+
+    def comment_records(self):
+        if not self.users or not self.posts:
+            return
+        for _ in range(self.comments):
+            index = self.rng.randrange(self.posts)
+            created = self.post_date(index) + timedelta(
+                minutes=self.rng.randint(1, 60 * 24)
+            )
+            yield {
+                'type': 'comment',
+                'post': self.first_post_id + index,
+                'author': username(self.rng.randrange(self.users)),
+                'text': self.fake.sentence(),
+                'created': min(created, self.until).isoformat(),
+            }
+
+    def make_images(self):
+        """Набор картинок, общий для всех постов: хранилище по хэшу
+        содержимого не плодит копии одинаковых файлов."""
+        images = []
+        for _ in range(self.images):
+            image = Image.new('RGB', IMAGE_SIZE, self.fake.hex_color())
+            draw = ImageDraw.Draw(image)
+            for _ in range(10):
+                x, y = (self.rng.randrange(size) for size in IMAGE_SIZE)
+                radius = self.rng.randint(50, 400)
+                draw.ellipse((x - radius, y - radius, x + radius, y + radius),
+                             fill=self.fake.hex_color())
+            buffer = BytesIO()
+            image.save(buffer, 'JPEG', quality=85)
+            name = post_image_storage.save('posts/seed.jpg',
+                                           ContentFile(buffer.getvalue()))
+            images.append({'image': name, **read_image_metadata(name)})
+        return images
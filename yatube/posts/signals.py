@@ -0,0 +1,190 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .counts import change_counts, count_key, post_count_keys
+from .feed import fan_out_post, follow_author, unfollow_author
+from .images import EMPTY_METADATA, header_metadata
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+from .search import get_backend
+from .stats import change_author_stats, change_comment_count
+from .thumbnails import schedule_image_processing
+from .versions import bump_versions, comment_scopes
+
+
+@receiver(post_init, sender=Post)
+def remember_post_state(sender, instance, **kwargs):
+    # читаем сырые значения: обращение к отложенному полю стоило бы запроса
+    instance._initial_group_id = instance.__dict__.get('group_id')
+    instance._initial_image = str(instance.__dict__.get('image') or '')
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        change_counts(post_count_keys(instance.group_id), 1)
+    elif instance._initial_group_id != instance.group_id:
+        if instance._initial_group_id is not None:
+            change_counts([count_key('group', instance._initial_group_id)],
+                          -1)
+        if instance.group_id is not None:
+            change_counts([count_key('group', instance.group_id)], 1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_created_post(sender, instance, created, **kwargs):
+    if created:
+        fan_out_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    change_counts(post_count_keys(instance.group_id), -1)
+
+
+@receiver(post_delete, sender=Group)
+def forget_group_count(sender, instance, **kwargs):
+    cache.delete(count_key('group', instance.pk))
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_author_post(sender, instance, created, **kwargs):
+    if created:
+        change_author_stats(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_author_post(sender, instance, **kwargs):
+    change_author_stats(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        change_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    change_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        change_author_stats(instance.author_id, followers_count=1)
+        change_author_stats(instance.user_id, following_count=1)
+        bump_versions(('author', instance.author_id))
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    change_author_stats(instance.author_id, followers_count=-1)
+    change_author_stats(instance.user_id, following_count=-1)
+    bump_versions(('author', instance.author_id))
+
+
+# после count_follow: ленты смотрят на уже сдвинутое число подписчиков
+@receiver(post_save, sender=Follow)
+def update_follower_feed(sender, instance, created, **kwargs):
+    if created:
+        follow_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_follower_feed(sender, instance, **kwargs):
+    unfollow_author(instance.user_id, instance.author_id)
+
+
+def post_version_scopes(post):
+    scopes = [('index',), ('author', post.author_id), ('post', post.pk)]
+    for group_id in {post._initial_group_id, post.group_id}:
+        if group_id is not None:
+            scopes.append(('group', group_id))
+    return scopes
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_versions(sender, instance, **kwargs):
+    bump_versions(*post_version_scopes(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_versions(sender, instance, **kwargs):
+    post_field = Comment._meta.get_field('post')
+    if post_field.is_cached(instance):
+        post = instance.post
+        posts = [(post.author_id, post.group_id)]
+    else:
+        posts = Post.objects.filter(pk=instance.post_id).values_list(
+            'author_id', 'group_id'
+        )
+    # при удалении поста его списки уже сдвинул bump_post_versions
+    scopes = [scope for author_id, group_id in posts
+              for scope in comment_scopes(author_id, group_id)]
+    bump_versions(('post', instance.post_id), *scopes)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_group_versions(sender, instance, **kwargs):
+    bump_versions(('index',), ('group', instance.pk), ('groups',))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_user_versions(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_versions(('index',), ('author', instance.pk), ('users',))
+
+
+@receiver(pre_save, sender=Post)
+def fill_image_metadata(sender, instance, raw=False, **kwargs):
+    """Размеры новой картинки читаются из заголовка, пока она в памяти."""
+    if raw:
+        return
+    if not instance.image:
+        metadata = EMPTY_METADATA
+    elif not instance.image._committed:
+        metadata = header_metadata(instance.image)
+    else:
+        return
+    for field, value in metadata.items():
+        setattr(instance, field, value)
+
+
+@receiver(post_save, sender=Post)
+def process_uploaded_image(sender, instance, **kwargs):
+    name = instance.image.name
+    if name and name != instance._initial_image:
+        transaction.on_commit(lambda: schedule_image_processing(name))
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    if update_fields and 'text' not in update_fields:
+        return
+    get_backend().index(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_backend().remove(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def reset_post_state(sender, instance, **kwargs):
+    # подключается последним: остальные обработчики уже сравнили поля
+    instance._initial_group_id = instance.group_id
+    instance._initial_image = instance.image.name
@@ -0,0 +1,130 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Post, User
+
+
+def change_author_stats(user_id, **deltas):
+    """Сдвигает счётчики автора через F().
+
+    Если строки ещё нет, она создаётся сразу с точными значениями.
+    При удалении пользователя строка уже может быть удалена каскадом,
+    поэтому уменьшение счётчиков её не воссоздаёт.
+    """
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if AuthorStats.objects.filter(user_id=user_id).update(**changes):
+        return
+    if all(delta > 0 for delta in deltas.values()):
+        AuthorStats.objects.get_or_create(user_id=user_id)
+        AuthorStats.objects.filter(user_id=user_id).update(
+            **actual_author_stats()
+        )
+
+
+def _by_delta(deltas):
+    grouped = defaultdict(list)
+    for pk, delta in deltas.items():
+        grouped[delta].append(pk)
+    return grouped.items()
+
+
+def change_many_author_stats(field, deltas):
+    """Сдвигает одно поле у многих авторов {id: сдвиг}.
+
+    Авторы с одинаковым сдвигом обновляются одним запросом, строки
+    отсутствующих создаются так же, как в change_author_stats.
+    """
+    for delta, user_ids in _by_delta(deltas):
+        updated = AuthorStats.objects.filter(user_id__in=user_ids).update(
+            **{field: F(field) + delta}
+        )
+        if updated == len(user_ids):
+            continue
+        existing = set(AuthorStats.objects.filter(
+            user_id__in=user_ids
+        ).values_list('user_id', flat=True))
+        for user_id in set(user_ids) - existing:
+            change_author_stats(user_id, **{field: delta})
+
+
+def change_comment_count(post_id, delta):
+    change_comment_counts({post_id: delta})
+
+
+def change_comment_counts(deltas):
+    for delta, post_ids in _by_delta(deltas):
+        Post.objects.filter(pk__in=post_ids).update(
+            comment_count=F('comment_count') + delta
+        )
+
+
+def _count(queryset, field):
+    counted = queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+        field
+    ).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counted), 0)
+
+
+def actual_author_stats():
+    return {
+        'posts_count': _count(Post.objects.all(), 'author'),
+        'followers_count': _count(Follow.objects.all(), 'author'),
+        'following_count': _count(Follow.objects.all(), 'user'),
+    }
+
+
+def _pk_ranges(queryset, batch_size):
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = 0
+    while True:
+        bound = pks.filter(pk__gt=last_pk)[batch_size - 1:batch_size]
+        bound = list(bound)
+        if not bound:
+            yield last_pk, None
+            return
+        yield last_pk, bound[0]
+        last_pk = bound[0]
+
+
+def author_stats_drift():
+    actual = actual_author_stats()
+    return AuthorStats.objects.annotate(
+        **{f'actual_{field}': value for field, value in actual.items()}
+    ).exclude(
+        posts_count=F('actual_posts_count'),
+        followers_count=F('actual_followers_count'),
+        following_count=F('actual_following_count'),
+    )
+
+
+def comment_count_drift():
+    return Post.objects.annotate(
+        actual_comment_count=_count(Comment.objects.all(), 'post')
+    ).exclude(comment_count=F('actual_comment_count'))
+
+
+def reconcile_author_stats(batch_size):
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True
+    ).iterator()
+    while True:
+        batch = [AuthorStats(user_id=pk) for pk in islice(missing, batch_size)]
+        if not batch:
+            break
+        AuthorStats.objects.bulk_create(batch, ignore_conflicts=True)
+    for low, high in _pk_ranges(AuthorStats.objects.all(), batch_size):
+        batch = AuthorStats.objects.filter(pk__gt=low)
+        if high is not None:
+            batch = batch.filter(pk__lte=high)
+        batch.update(**actual_author_stats())
+
+
+def reconcile_comment_counts(batch_size):
+    for low, high in _pk_ranges(Post.objects.all(), batch_size):
+        batch = Post.objects.filter(pk__gt=low)
+        if high is not None:
+            batch = batch.filter(pk__lte=high)
+        batch.update(comment_count=_count(Comment.objects.all(), 'post'))
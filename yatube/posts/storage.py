@@ -0,0 +1,58 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+# имя, которое уже выдало хранилище: posts/ab/cd/<sha256>.jpg
+HASHED_NAME = re.compile(
+    r'(?P<root>.*?)/?[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$'
+)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, которое называет файлы хешем содержимого.
+
+    Файл попадает в posts/ab/cd/<sha256>.jpg: одинаковые картинки
+    хранятся один раз и делят миниатюры, а каталоги не разрастаются.
+    Поэтому файлы из этого хранилища нельзя удалять вместе с постом.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        # пережатая картинка сохраняется под именем оригинала: каталоги
+        # шардов берутся от корня, а не вкладываются в прежние
+        hashed = HASHED_NAME.match(name)
+        if hashed:
+            name = os.path.join(hashed['root'], os.path.basename(name))
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], digest[2:4],
+                            digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            try:
+                # у повторной загрузки время файла - как у нового: сборщик
+                # мусора не удалит его, пока пост с ним ещё не сохранён
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                # сборщик успел удалить файл, пишем его заново
+                pass
+        return super().save(name, content, max_length)
+
+
+post_image_storage = ContentAddressedStorage()
@@ -0,0 +1,124 @@
+import logging
+from hashlib import md5
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from ..thumbnails import (post_thumbnails, prefetch_thumbnails,
+                          variant_key, variant_size)
+
+logger = logging.getLogger(__name__)
+
+register = template.Library()
+
+FRAGMENT_KEY = 'posts:fragment:{pk}:{version}'
+
+
+def post_fragment_key(post, show_group):
+    """Ключ фрагмента поста: хеш всех полей, которые выводит шаблон.
+
+    Правка поста, автора или группы меняет ключ, поэтому устаревшие
+    фрагменты не нужно удалять - они просто перестают читаться. В ключ
+    входят и готовые варианты миниатюр: заглушка, нарисованная до конца
+    фоновой обработки, сменяется картинкой, как только пул её закончит.
+    """
+    author = post.author
+    parts = [post.text, post.image.name, post.image_placeholder,
+             post.pub_date.isoformat(), author.username, author.first_name,
+             author.last_name]
+    if show_group and post.group_id:
+        parts += [post.group.slug, post.group.title]
+    parts += sorted(f'{geometry}:{image_format}' for geometry, image_format
+                    in getattr(post, 'thumbnails', ()))
+    version = md5('\x00'.join(parts).encode()).hexdigest()
+    return FRAGMENT_KEY.format(pk=post.pk, version=version)
+
+
+@register.simple_tag(takes_context=True)
+def post_fragments(context, posts):
+    """Отрисованные посты: одно чтение из кэша, рисуются только промахи."""
+    group = context.get('group')
+    # готовность миниатюр входит в ключ, поэтому читается до кэша
+    # фрагментов; у прогретой страницы это одно чтение из кэша sorl
+    prefetch_thumbnails(posts)
+    keys = [post_fragment_key(post, not group) for post in posts]
+    fragments = cache.get_many(keys)
+    missing = {key: post for key, post in zip(keys, posts)
+               if key not in fragments}
+    for key, post in missing.items():
+        missing[key] = render_to_string('posts/includes/post.html',
+                                        {'post': post, 'group': group})
+    if missing:
+        cache.set_many(missing, settings.POST_FRAGMENT_TIMEOUT)
+        fragments.update(missing)
+    return [mark_safe(fragments[key]) for key in keys]
+
+
+def srcset(images):
+    return ', '.join(f'{image["url"]} {image["width"]}w' for image in images)
+
+
+def picture_variants(post, thumbnails):
+    """Готовые варианты по форматам и размер самого крупного варианта."""
+    by_format = {}
+    largest = None
+    for geometry, options in settings.THUMBNAIL_GEOMETRIES:
+        variant = variant_key(geometry, options)
+        if post.image_width and post.image_height:
+            width, height = variant_size(geometry, options, post.image_width,
+                                         post.image_height)
+            if largest is None or width > largest['width']:
+                largest = {'width': width, 'height': height}
+        elif variant in thumbnails:
+            # у старых постов без сохранённых размеров их знает хранилище
+            width, height = thumbnails[variant].size
+        else:
+            continue
+        if variant in thumbnails:
+            by_format.setdefault(variant[1], []).append({
+                'url': thumbnails[variant].url,
+                'width': width,
+                'height': height,
+            })
+    return by_format, largest
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post):
+    """Картинка поста: <picture> с srcset по ширинам в каждом формате.
+
+    Последний из THUMBNAIL_FORMATS идёт в <img> для старых браузеров.
+    Размеры вариантов считаются по сохранённым размерам картинки, чтобы
+    вёрстка не прыгала; пока миниатюр нет, выводится заглушка того же
+    размера, что и самый крупный вариант.
+    """
+    if not post.image:
+        return {}
+    try:
+        thumbnails = post_thumbnails(post)
+    except Exception:
+        # как и тег thumbnail, битая картинка не должна ронять страницу
+        logger.exception('Не удалось получить миниатюры')
+        return {}
+    by_format, largest = picture_variants(post, thumbnails)
+    if not by_format:
+        # миниатюры ещё делает пул: место под картинку держит заглушка
+        return {'pending': largest, 'placeholder': post.image_placeholder}
+    formats = [image_format for image_format in settings.THUMBNAIL_FORMATS
+               if image_format in by_format]
+    for images in by_format.values():
+        images.sort(key=lambda image: image['width'])
+    fallback = by_format[formats[-1]]
+    return {
+        'sources': [
+            {'type': f'image/{image_format.lower()}',
+             'srcset': srcset(by_format[image_format])}
+            for image_format in formats[:-1]
+        ],
+        'image': fallback[-1],
+        'placeholder': post.image_placeholder,
+        'srcset': srcset(fallback),
+    }
@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..admin import group_labels
+from ..counts import count_key
+from ..models import Group, Post, User
+
+
+class PostAdminTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        cls.groups = [
+            Group.objects.create(title=f'Группа {i}', slug=f'group-{i}',
+                                 description='Описание')
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:posts_post_changelist')
+
+    def create_posts(self, number):
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.admin,
+                 group=self.groups[i % len(self.groups)])
+            for i in range(number)
+        )
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Строки и выбор группы не добавляют запросов."""
+        self.create_posts(2)
+        self.client.get(self.url)
+        # сессия, пользователь и одна страница постов, без COUNT(*)
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        self.create_posts(20)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        # в каждом <select> только выбранная группа и пустой вариант
+        self.assertContains(response, '<option value="">', count=22)
+
+    def test_group_labels_cover_only_page_groups(self):
+        """Правка групп не заставляет перечитывать все группы сайта."""
+        self.create_posts(2)
+        self.client.get(self.url)
+        group = Group.objects.create(title='Новая группа', slug='new',
+                                     description='Описание')
+        Post.objects.update(group=group)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Новая группа', count=2)
+        with self.assertNumQueries(1):
+            labels = group_labels([self.groups[0].pk, self.groups[1].pk])
+        self.assertEqual(labels, {str(self.groups[0].pk): 'Группа 0',
+                                  str(self.groups[1].pk): 'Группа 1'})
+        with self.assertNumQueries(0):
+            group_labels([self.groups[0].pk])
+
+    def test_count_comes_from_cached_counter(self):
+        self.create_posts(3)
+        cache.set(count_key('all'), 2)
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+    def test_search_uses_index(self):
+        Post.objects.create(text='Редкое слово', author=self.admin)
+        self.create_posts(2)
+        response = self.client.get(self.url, {'q': 'редк'})
+        self.assertEqual(response.context['cl'].result_count, 1)
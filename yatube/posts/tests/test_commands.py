@@ -0,0 +1,315 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from ..benchmarks import run_benchmarks
+from ..models import (AuthorStats, Comment, FeedEntry, Follow, Group, Post,
+                      User)
+from ..search import get_backend
+from ..seeding import Seeder
+from ..stats import author_stats_drift, comment_count_drift
+from ..storage import post_image_storage
+from ..thumbnails import make_thumbnails
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x02\x00"
+    b"\x01\x00\x80\x00\x00\x00\x00\x00"
+    b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+    b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+    b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+    b"\x0A\x00\x3B"
+)
+
+
+class ExplainViewsCommandTests(TestCase):
+    def test_cursor_queries_do_not_sort_without_index(self):
+        """Запросы списочных страниц читают посты по индексу."""
+        out = StringIO()
+        call_command('explain_views', check=True, stdout=out)
+        self.assertIn('group_posts', out.getvalue())
+
+
+class ReconcileCountersCommandTests(TestCase):
+    def test_drift_is_repaired(self):
+        """Команда исправляет разошедшиеся счётчики."""
+        author = User.objects.create(username='author')
+        reader = User.objects.create(username='reader')
+        post = Post.objects.create(text='Пост', author=author)
+        Comment.objects.create(post=post, author=reader, text='Комментарий')
+        Follow.objects.create(user=reader, author=author)
+        AuthorStats.objects.update(posts_count=42, followers_count=0)
+        Post.objects.update(comment_count=7)
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        stats = AuthorStats.objects.get(user=author)
+        self.assertEqual((stats.posts_count, stats.followers_count), (1, 1))
+        self.assertEqual(AuthorStats.objects.get(user=reader).following_count,
+                         1)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class CollectMediaGarbageCommandTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        user = User.objects.create(username='author')
+        self.post = Post.objects.create(
+            author=user, text='Пост',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF)
+        )
+        self.orphan = Post.objects.create(
+            author=user, text='Удалённый пост',
+            image=SimpleUploadedFile('other.gif', SMALL_GIF + b'\x00')
+        )
+        make_thumbnails(self.orphan.image.name)
+        self.orphan_source = ImageFile(self.orphan.image)
+        self.orphan_thumbnails = default.kvstore._get(
+            self.orphan_source.key, identity='thumbnails'
+        )
+        self.orphan.delete()
+        self.stale = default.storage.save('cache/00/00/stale.jpg',
+                                          ContentFile(b'jpeg'))
+
+    def collect(self, **options):
+        out = StringIO()
+        call_command('collect_media_garbage', min_age_hours=0,
+                     batch_size=1, stdout=out, **options)
+        return out.getvalue()
+
+    def test_dry_run_keeps_files(self):
+        out = self.collect(dry_run=True)
+        self.assertIn(self.orphan.image.name, out)
+        self.assertIn('Картинок без постов: 1', out)
+        self.assertIn('Потерянных миниатюр: 1', out)
+        self.assertTrue(post_image_storage.exists(self.orphan.image.name))
+
+    def test_orphans_are_deleted(self):
+        """Удаляются только картинки без постов и их миниатюры."""
+        self.collect()
+        self.assertTrue(post_image_storage.exists(self.post.image.name))
+        self.assertFalse(post_image_storage.exists(self.orphan.image.name))
+        self.assertFalse(default.storage.exists(self.stale))
+        self.assertTrue(self.orphan_thumbnails)
+        self.assertIsNone(default.kvstore.get(self.orphan_source))
+        for key in self.orphan_thumbnails:
+            self.assertIsNone(default.kvstore._get(key))
+
+    def test_reuploaded_image_is_not_collected(self):
+        """Повторная загрузка той же картинки освежает время файла,
+           и min_age_hours защищает его до сохранения поста."""
+        name = self.orphan.image.name
+        os.utime(post_image_storage.path(name), (0, 0))
+        self.assertEqual(
+            post_image_storage.save('posts/again.gif',
+                                    ContentFile(SMALL_GIF + b'\x00')),
+            name
+        )
+        call_command('collect_media_garbage', min_age_hours=1,
+                     stdout=StringIO())
+        self.assertTrue(post_image_storage.exists(name))
+
+
+class ImportPostsCommandTests(TestCase):
+    RECORDS = [
+        {'id': 500, 'author': 'author', 'group': 'cats', 'text': 'Кошки',
+         'pub_date': '2020-01-02T03:04:05+00:00'},
+        {'author': 'newcomer', 'text': 'Собаки'},
+        {'type': 'comment', 'post': 500, 'author': 'reader',
+         'text': 'Комментарий'},
+        {'type': 'follow', 'user': 'reader', 'author': 'author'},
+        {'author': 'author', 'group': 'missing', 'text': 'Без группы'},
+        {'type': 'follow', 'user': 'reader', 'author': 'author'},
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        self.reader = User.objects.create(username='reader')
+        Group.objects.create(title='Кошки', slug='cats', description='-')
+
+    def write(self, name, lines):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines))
+        return path
+
+    def import_posts(self, path, **options):
+        out = StringIO()
+        call_command('import_posts', path, batch_size=2, stdout=out,
+                     **options)
+        return out.getvalue()
+
+    def test_jsonl_import_keeps_derived_data_in_sync(self):
+        """Импорт обновляет счётчики, индекс поиска и ленты."""
+        path = self.write('posts.jsonl',
+                          [json.dumps(record) for record in self.RECORDS]
+                          + ['не json'])
+        out = self.import_posts(path, create_users=True)
+        self.assertIn('Пропущено (unknown_group): 1', out)
+        self.assertIn('Пропущено (duplicate): 1', out)
+        self.assertIn('Пропущено (invalid): 1', out)
+        post = Post.objects.get(source_id='500')
+        self.assertEqual(post.group.slug, 'cats')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.comment_count, 1)
+        self.assertTrue(Post.objects.filter(author__username='newcomer',
+                                            text='Собаки').exists())
+        self.assertFalse(author_stats_drift().exists())
+        self.assertFalse(comment_count_drift().exists())
+        self.assertEqual(list(get_backend().search('кошки')), [post])
+        self.assertTrue(FeedEntry.objects.filter(user=self.reader,
+                                                 post=post).exists())
+
+    def test_source_ids_do_not_clash_with_local_posts(self):
+        """id из источника не занимает id в базе: пост с тем же id
+        не пропускается, а комментарий не попадает к чужому посту."""
+        local = Post.objects.create(text='Местный', author=self.author)
+        path = self.write('posts.jsonl', [json.dumps(record) for record in (
+            {'id': local.pk, 'author': 'author', 'text': 'Внешний'},
+            {'type': 'comment', 'post': local.pk, 'author': 'reader',
+             'text': 'Ответ'},
+        )])
+        self.import_posts(path, source='blog')
+        post = Post.objects.get(source_id=f'blog:{local.pk}')
+        self.assertNotEqual(post.pk, local.pk)
+        self.assertEqual(post.comments.get().text, 'Ответ')
+        self.assertFalse(local.comments.exists())
+        self.import_posts(path, source='blog')
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_checkpoint_resumes_import(self):
+        """Повторный запуск продолжает с контрольной точки."""
+        path = self.write('posts.csv', ['author,text', 'author,Первый',
+                                        'author,Второй', 'author,Третий'])
+        checkpoint = os.path.join(self.directory, 'checkpoint.json')
+        with open(checkpoint, 'w') as file:
+            json.dump({'source': path, 'records': 2}, file)
+        self.import_posts(path, checkpoint=checkpoint)
+        self.assertEqual(list(Post.objects.values_list('text', flat=True)),
+                         ['Третий'])
+        with open(checkpoint) as file:
+            self.assertEqual(json.load(file)['records'], 3)
+
+    def test_export_can_be_imported_back(self):
+        """Полная выгрузка загружается обратно без потерь."""
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   group=Group.objects.get())
+        Comment.objects.create(post=post, author=self.reader, text='Ответ')
+        Follow.objects.create(user=self.reader, author=self.author)
+        path = os.path.join(self.directory, 'site.jsonl.gz')
+        call_command('export_posts', path, stdout=StringIO())
+        Group.objects.all().delete()
+        User.objects.all().delete()
+        self.import_posts(path, create_users=True)
+        post = Post.objects.get(source_id=str(post.pk))
+        self.assertEqual((post.author.username, post.group.slug),
+                         ('author', 'cats'))
+        self.assertEqual(post.comments.get().author.username, 'reader')
+        self.assertTrue(Follow.objects.filter(
+            user__username='reader', author__username='author'
+        ).exists())
+        self.assertFalse(author_stats_drift().exists())
+
+    def test_export_round_trip_into_clean_database(self):
+        """Выгрузка, загруженная в пустую базу, воспроизводит сайт."""
+        User.objects.filter(pk=self.author.pk).update(
+            first_name='Лев', last_name='Толстой', email='lev@example.com'
+        )
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=Group.objects.get(),
+            image='posts/ab/cd/picture.gif', image_width=2, image_height=1,
+            image_size=43, image_placeholder='data:image/png;base64,AA=='
+        )
+        Post.objects.create(text='Без картинки', author=self.reader)
+        Comment.objects.create(post=post, author=self.reader, text='Ответ')
+        Follow.objects.create(user=self.reader, author=self.author)
+
+        def snapshot():
+            return (
+                set(User.objects.values_list(
+                    'username', 'first_name', 'last_name', 'email')),
+                set(Group.objects.values_list('slug', 'title',
+                                              'description')),
+                set(Post.objects.values_list(
+                    'author__username', 'group__slug', 'text', 'pub_date',
+                    'image', 'image_width', 'image_height', 'image_size',
+                    'image_placeholder')),
+                set(Comment.objects.values_list(
+                    'post__text', 'author__username', 'text', 'created')),
+                set(Follow.objects.values_list('user__username',
+                                               'author__username')),
+            )
+
+        before = snapshot()
+        path = os.path.join(self.directory, 'site.jsonl.gz')
+        call_command('export_posts', path, stdout=StringIO())
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        # без create_users: авторы берутся из самой выгрузки
+        self.import_posts(path)
+        self.assertEqual(snapshot(), before)
+        self.assertFalse(author_stats_drift().exists())
+
+
+class SeedCommandTests(TestCase):
+    def test_seed_is_deterministic(self):
+        records = [
+            list(Seeder(5, 2, 10, 10, 10, seed=1).records())
+            for _ in range(2)
+        ]
+        self.assertEqual(records[0], records[1])
+        self.assertNotEqual(
+            records[0], list(Seeder(5, 2, 10, 10, 10, seed=2).records())
+        )
+
+    def test_seed_fills_database(self):
+        call_command('seed', users=10, groups=2, posts=30, comments=20,
+                     follows=15, batch_size=7, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 20)
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(author_stats_drift().exists())
+        self.assertFalse(comment_count_drift().exists())
+
+
+class BenchmarkTests(TestCase):
+    def test_results_cover_views_and_templates(self):
+        results = run_benchmarks([20], repeat=2)
+        json.dumps(results)
+        dataset, = results['datasets']
+        self.assertEqual(dataset['posts'], 20)
+        self.assertEqual(set(dataset['views']), {
+            'index', 'group_posts', 'profile', 'post_detail', 'follow_index'
+        })
+        for view in dataset['views'].values():
+            self.assertEqual(view['cold']['status'], 200)
+            self.assertGreater(view['cold']['bytes'], 0)
+            self.assertGreaterEqual(view['cold']['p95_ms'],
+                                    view['cold']['p50_ms'])
+        self.assertEqual(set(dataset['templates']), {'10', '100', '1000'})
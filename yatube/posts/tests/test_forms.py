@@ -9,13 +9,14 @@ from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from ..models import Group, Post, Comment, User
+from ..thumbnails import make_thumbnails
 
 User = get_user_model()
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -60,15 +61,17 @@ class PostFormTests(TestCase):
         form_data = {'text': 'Тестовый текст 2',
                      'image': self.uploaded}
         response = self.authorized_client.post(
-            reverse('posts:post_create'), data=form_data, follow=True
+            reverse('posts:post_create'), data=form_data
         )
+        self.assertEqual(Post.objects.count(), posts_count + 1)
+        post = Post.objects.get(text=form_data['text'])
+        # в TestCase on_commit не срабатывает: миниатюры создаются так,
+        # как их создал бы фоновый пул после сохранения
+        make_thumbnails(post.image.name)
         self.assertRedirects(
             response, reverse('posts:profile',
                               kwargs={'username': self.user.username})
         )
-        self.assertEqual(Post.objects.count(), posts_count + 1)
-        self.assertTrue(Post.objects.filter(text=form_data['text']).exists())
-        self.assertEqual(response.status_code, HTTPStatus.OK)
 
     def test_post_edit(self):
         """Валидная форма изменяет запись в Post."""
@@ -114,6 +117,29 @@ class PostFormTests(TestCase):
             follow=True)
         self.assertEqual(response.status_code, HTTPStatus.OK)
 
+    @override_settings(POST_IMAGE_MAX_BYTES=16)
+    def test_oversized_upload_is_rejected_while_streaming(self):
+        """Приём файла больше лимита обрывается, пост не создаётся."""
+        posts_count = Post.objects.count()
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Большая картинка',
+                  'image': SimpleUploadedFile('big.gif', self.small_gif)},
+        )
+        self.assertFormError(response, 'form', 'image',
+                             'Файл больше 16\xa0байт')
+        self.assertEqual(Post.objects.count(), posts_count)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1)
+    def test_too_many_pixels_are_rejected_by_header(self):
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Широкая картинка',
+                  'image': SimpleUploadedFile('wide.gif', self.small_gif)},
+        )
+        self.assertFormError(response, 'form', 'image',
+                             'Картинка 2x1 слишком большая')
+
     def test_authorized_client_can_create_comment(self):
         """Авторизованный пользователь может создать комментарий и он появится
            на странице поста."""
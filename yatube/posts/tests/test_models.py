@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Follow, Group, Post
 
 User = get_user_model()
 
@@ -58,3 +59,10 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(self.post._meta.get_field(field).help_text,
                                  expected)
+
+    def test_follow_is_unique(self):
+        """Повторная подписка на того же автора запрещена в БД."""
+        reader = User.objects.create(username='Reader')
+        Follow.objects.create(user=reader, author=self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=reader, author=self.user)
@@ -0,0 +1,44 @@
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import TestCase
+
+from ..models import Group, Post, User
+from ..templatetags.post_cache import post_fragment_key
+
+
+class PostFragmentsTagTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='NoName')
+        cls.group = Group.objects.create(title='Тестовая группа',
+                                         slug='test-slug',
+                                         description='Тестовое описание')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост',
+                                       group=cls.group)
+        cls.template = Template(
+            '{% load post_cache %}{% post_fragments posts as fragments %}'
+            '{% for fragment in fragments %}{{ fragment }}{% endfor %}'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self, **context):
+        posts = list(Post.objects.select_related('author', 'group'))
+        return self.template.render(Context({'posts': posts, **context}))
+
+    def test_fragments_are_read_from_cache(self):
+        """Посты рисуются один раз, затем берутся из кэша."""
+        self.assertIn('Тестовый пост', self.render())
+        cache.set(post_fragment_key(self.post, True), 'из кэша')
+        self.assertEqual(self.render(), 'из кэша')
+
+    def test_group_rename_changes_fragment(self):
+        self.render()
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertIn('Новое название', self.render())
+
+    def test_group_page_fragment_hides_group_link(self):
+        self.assertNotIn('все записи группы', self.render(group=self.group))
@@ -0,0 +1,245 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from ..models import Post, User
+from ..storage import post_image_storage
+from ..thumbnails import (make_thumbnails, prefetch_thumbnails,
+                          process_image, thumbnail_geometries, variant_key,
+                          variant_size)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x02\x00"
+    b"\x01\x00\x80\x00\x00\x00\x00\x00"
+    b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+    b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+    b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+    b"\x0A\x00\x3B"
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='NoName')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # миниатюры одинаковых картинок общие, кэш хранилища sorl
+        # не должен переживать откат транзакции предыдущего теста
+        cache.clear()
+
+    def create_post(self):
+        return Post.objects.create(
+            author=self.user, text='Тестовый пост',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF,
+                                     content_type='image/gif')
+        )
+
+    @mock.patch('posts.signals.transaction.on_commit', lambda func: func())
+    @mock.patch('posts.signals.schedule_image_processing')
+    def test_new_image_is_scheduled_once(self, schedule):
+        """Обработка заказывается только при смене картинки."""
+        post = self.create_post()
+        schedule.assert_called_once_with(post.image.name)
+        post.text = 'Новый текст'
+        post.save()
+        schedule.assert_called_once()
+
+    def test_thumbnails_are_ready_after_pipeline(self):
+        post = self.create_post()
+        make_thumbnails(post.image.name)
+        source = default.kvstore.get(ImageFile(post.image))
+        self.assertIsNotNone(source)
+        thumbnails = default.kvstore._get(source.key, identity='thumbnails')
+        self.assertEqual(len(thumbnails), len(thumbnail_geometries()))
+
+    def test_prefetch_reads_page_in_one_query(self):
+        """Промахи кэша по всей странице дочитываются одним запросом."""
+        posts = [self.create_post() for _ in range(3)]
+        for post in posts:
+            make_thumbnails(post.image.name)
+        cache.clear()
+        with self.assertNumQueries(1):
+            prefetch_thumbnails(posts)
+        with self.assertNumQueries(0):
+            prefetch_thumbnails(posts)
+        variants = {variant_key(geometry, options)
+                    for geometry, options in thumbnail_geometries()}
+        for post in posts:
+            self.assertEqual(set(post.thumbnails), variants)
+
+    def test_identical_uploads_share_file_and_thumbnails(self):
+        """Одинаковые картинки хранятся один раз под хешем содержимого."""
+        first, second = self.create_post(), self.create_post()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name,
+                         r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+        make_thumbnails(first.image.name)
+        prefetch_thumbnails([first, second])
+        self.assertTrue(second.thumbnails)
+        self.assertEqual(first.thumbnails, second.thumbnails)
+
+    def test_picture_uses_prefetched_variants(self):
+        """Тег рисует srcset по всем вариантам без обращения к хранилищу."""
+        post = self.create_post()
+        post.thumbnails = {}
+        for geometry, options in settings.THUMBNAIL_GEOMETRIES:
+            width = geometry.split('x')[0]
+            extension = options['format'].lower()
+            # размеры берутся из полей поста, а не из хранилища миниатюр
+            post.thumbnails[variant_key(geometry, options)] = SimpleNamespace(
+                url=f'/{width}.{extension}', size=None
+            )
+        template = Template('{% load post_cache %}{% post_picture post %}')
+        with self.assertNumQueries(0):
+            html = template.render(Context({'post': post}))
+        self.assertIn('<source type="image/webp" srcset="/480.webp 480w, '
+                      '/720.webp 720w, /960.webp 960w"', html)
+        self.assertIn('src="/960.jpeg"', html)
+        self.assertIn('width="960" height="339"', html)
+
+    def test_fragment_is_redrawn_when_thumbnails_are_ready(self):
+        """Фрагмент с заглушкой не переживает окончание обработки."""
+        post = self.create_post()
+        url = reverse('posts:profile', args=[self.user.username])
+        self.assertNotContains(self.client.get(url), '<picture>')
+        make_thumbnails(post.image.name)
+        self.assertContains(self.client.get(url), '<picture>')
+
+    def test_variant_size_follows_sorl(self):
+        """Размер варианта совпадает с тем, что делает движок sorl."""
+        cases = [
+            ('960x339', {'crop': 'center'}, (2000, 1000), (960, 339)),
+            ('960x339', {'crop': 'center'}, (2, 1), (960, 339)),
+            ('960x339', {'crop': 'center', 'upscale': False}, (400, 100),
+             (400, 100)),
+            ('480x480', {}, (2000, 1000), (480, 240)),
+            ('480', {'upscale': False}, (200, 100), (200, 100)),
+        ]
+        for geometry, options, size, expected in cases:
+            with self.subTest(geometry=geometry, options=options, size=size):
+                self.assertEqual(variant_size(geometry, options, *size),
+                                 expected)
+        post = self.create_post()
+        make_thumbnails(post.image.name)
+        prefetch_thumbnails([post])
+        for geometry, options in thumbnail_geometries():
+            self.assertEqual(
+                post.thumbnails[variant_key(geometry, options)].size,
+                list(variant_size(geometry, options, post.image_width,
+                                  post.image_height))
+            )
+
+    def test_page_does_not_generate_missing_thumbnails(self):
+        """Без готовых миниатюр страница рисует заглушку, а не ждёт sorl."""
+        post = self.create_post()
+        with mock.patch('sorl.thumbnail.base.ThumbnailBackend.get_thumbnail',
+                        autospec=True) as get_thumbnail:
+            response = self.client.get(
+                reverse('posts:profile', args=[self.user.username])
+            )
+        get_thumbnail.assert_not_called()
+        self.assertNotContains(response, '<picture>')
+        # заглушка размером с самый крупный вариант, а не с оригинал 2x1
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+        self.assertContains(response, post.text)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ImageMetadataTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='NoName')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self):
+        return Post.objects.create(
+            author=self.user, text='Тестовый пост',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF,
+                                     content_type='image/gif')
+        )
+
+    def test_upload_stores_metadata(self):
+        post = self.create_post()
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(SMALL_GIF))
+        process_image(post.image.name)
+        post.refresh_from_db()
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/png;base64,')
+        )
+        post.image = None
+        post.save()
+        post.refresh_from_db()
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_placeholder, '')
+
+    @override_settings(POST_IMAGE_MAX_SIDE=8)
+    def test_large_image_is_reencoded_without_exif(self):
+        """Фоновая обработка уменьшает картинку и убирает EXIF."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        buffer = BytesIO()
+        Image.new('RGB', (20, 10)).save(buffer, 'JPEG', exif=exif)
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост',
+            image=SimpleUploadedFile('photo.jpg', buffer.getvalue(),
+                                     content_type='image/jpeg')
+        )
+        original = post.image.name
+        process_image(original)
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, original)
+        # шарды нового имени не вкладываются в шарды оригинала
+        self.assertRegex(post.image.name,
+                         r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        self.assertFalse(post_image_storage.exists(original))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (8, 4))
+            self.assertFalse(image.getexif())
+        self.assertEqual((post.image_width, post.image_height), (8, 4))
+        self.assertEqual(post.image_size, post.image.size)
+
+    def test_backfill_fills_old_posts(self):
+        """Команда заполняет поля у постов, загруженных раньше."""
+        post = self.create_post()
+        Post.objects.update(image_width=None, image_placeholder='')
+        missing = Post.objects.create(author=self.user, text='Без файла',
+                                      image='posts/missing.gif')
+        out = StringIO()
+        call_command('backfill_image_metadata', workers=0, batch_size=1,
+                     stdout=out)
+        post.refresh_from_db()
+        self.assertEqual(post.image_width, 2)
+        self.assertTrue(post.image_placeholder)
+        missing.refresh_from_db()
+        self.assertIsNone(missing.image_width)
+        self.assertIn('Не удалось прочитать картинки: 1', out.getvalue())
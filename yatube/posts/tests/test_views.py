@@ -1,24 +1,32 @@
+import gzip
+import json
 import shutil
 import tempfile
+from http import HTTPStatus
 
 from django import forms
+from django.contrib import admin
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.paginator import Page
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from ..forms import PostForm
-from ..models import Comment, Group, Post, Follow
+from ..models import Comment, FeedEntry, Group, Post, Follow
+from ..search import get_backend
+from ..thumbnails import make_thumbnails
 
 User = get_user_model()
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostPagesTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -55,6 +63,9 @@ class PostPagesTests(TestCase):
             group=self.group,
             image=self.uploaded
         )
+        # в TestCase on_commit не срабатывает: миниатюры создаются так,
+        # как их создал бы фоновый пул после сохранения
+        make_thumbnails(self.post.image.name)
         self.comment = Comment.objects.create(
             post=self.post,
             author=self.user,
@@ -215,18 +226,122 @@ class PostPagesTests(TestCase):
         self.assertEqual(first_comment_text, self.comment.text)
 
     def test_check_cache(self):
-        """Проверка кеша."""
+        """Фрагменты кэшируются до изменения данных страницы."""
         post = Post.objects.create(text='Тестовый текст 3',
                                         author=self.user,
                                         group=self.group)
         response = self.guest_client.get(reverse('posts:index'))
-        post.delete()
+        Post.objects.filter(pk=post.pk).update(text='Изменено без сигналов')
         response_2 = self.guest_client.get(reverse('posts:index'))
         self.assertEqual(response.content, response_2.content)
-        cache.clear()
+        post.delete()
         response_3 = self.guest_client.get(reverse('posts:index'))
         self.assertNotEqual(response.content, response_3.content)
 
+    def test_group_and_author_changes_invalidate_pages(self):
+        """Изменение группы или автора сбрасывает кэш их страниц."""
+        group_url = reverse('posts:group_posts',
+                            kwargs={'slug': self.group.slug})
+        profile_url = reverse('posts:profile',
+                              kwargs={'username': self.user.username})
+        self.guest_client.get(group_url)
+        self.guest_client.get(profile_url)
+        self.user.first_name = 'Иван'
+        self.user.last_name = 'Петров'
+        self.user.save()
+        response = self.guest_client.get(group_url)
+        self.assertContains(response, 'Иван Петров')
+        response = self.guest_client.get(profile_url)
+        self.assertContains(response, 'Иван Петров', count=3)
+        self.group.title = 'Новое название'
+        self.group.save()
+        response = self.guest_client.get(profile_url)
+        self.assertContains(response, 'Новое название')
+
+    def test_anonymous_pages_answer_not_modified(self):
+        """Аноним получает 304, пока данные страницы не изменились."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        etag = self.guest_client.get(url)['ETag']
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Новый комментарий')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_authorized_pages_are_not_cached_whole(self):
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_counters_are_denormalized(self):
+        """Счётчики постов, подписчиков и комментариев ведутся в БД."""
+        reader = User.objects.create(username='Reader')
+        Follow.objects.create(user=reader, author=self.user)
+        self.user.stats.refresh_from_db()
+        self.assertEqual(self.user.stats.posts_count,
+                         Post.objects.filter(author=self.user).count())
+        self.assertEqual(self.user.stats.followers_count, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    @override_settings(COMMENTS_PER_PAGE=2)
+    def test_comments_are_paginated(self):
+        """Комментарии выводятся порциями по ключу (created, id)."""
+        comments = [self.comment] + [
+            Comment.objects.create(post=self.post, author=self.user,
+                                   text=f'Комментарий {i}')
+            for i in range(2)
+        ]
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        response = self.authorized_client.get(url)
+        self.assertEqual(list(response.context.get('comments')),
+                         comments[:2])
+        response = self.authorized_client.get(
+            url + f'?comments_after={response.context.get("comments_next")}'
+        )
+        self.assertEqual(list(response.context.get('comments')),
+                         comments[2:])
+        self.assertIsNone(response.context.get('comments_next'))
+
+    def test_comments_since_returns_only_newer(self):
+        new_comment = Comment.objects.create(post=self.post,
+                                             author=self.user,
+                                             text='Свежий комментарий')
+        url = reverse('posts:comments_since',
+                      kwargs={'post_id': self.post.id})
+        response = self.guest_client.get(
+            url, {'since': self.comment.pk, 'format': 'json'}
+        )
+        self.assertEqual(
+            [comment['id'] for comment in response.json()['comments']],
+            [new_comment.pk]
+        )
+        response = self.guest_client.get(url, {'since': self.comment.pk})
+        self.assertContains(response, 'Свежий комментарий')
+        self.assertNotContains(response, self.comment.text)
+
+    def test_comments_since_rejects_bad_cursor(self):
+        """Кривой since - 400, чужой или удалённый id - пустой ответ."""
+        url = reverse('posts:comments_since',
+                      kwargs={'post_id': self.post.id})
+        response = self.guest_client.get(url, {'since': 'abc'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        other_post = Post.objects.create(author=self.user, text='Другой')
+        other_comment = Comment.objects.create(post=other_post,
+                                               author=self.user,
+                                               text='Чужой комментарий')
+        for since in (other_comment.pk, other_comment.pk + 1000):
+            with self.subTest(since=since):
+                response = self.guest_client.get(
+                    url, {'since': since, 'format': 'json'}
+                )
+                self.assertEqual(response.json(),
+                                 {'comments': [], 'has_more': False})
+
     def test_follow_create(self):
         """Подписка создается при запросе соответствующего url"""
         self.user_2 = User.objects.create(username='Oleg')
@@ -296,6 +411,8 @@ class PaginatorViewsTest(TestCase):
         Post.objects.bulk_create(posts)
 
     def setUp(self):
+        # bulk_create не отправляет сигналы, счётчики в кэше устаревают
+        cache.clear()
         self.guest_client = Client()
 
     def test_first_page_contains_ten_records(self):
@@ -306,3 +423,298 @@ class PaginatorViewsTest(TestCase):
     def test_second_page_contains_three_records(self):
         response = self.guest_client.get(reverse('posts:index') + '?page=2')
         self.assertEqual(len(response.context.get('page_obj')), self.REMAINDER)
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        """Курсорные ссылки ведут на следующую и предыдущую страницы."""
+        response = self.guest_client.get(reverse('posts:index'))
+        first_page = list(response.context.get('page_obj'))
+        paginator = response.context.get('page_obj').paginator
+        self.assertIsNone(paginator.previous_cursor)
+        response = self.guest_client.get(
+            reverse('posts:index') + f'?after={paginator.next_cursor}'
+        )
+        paginator = response.context.get('page_obj').paginator
+        self.assertEqual(len(response.context.get('page_obj')), self.REMAINDER)
+        self.assertIsNone(paginator.next_cursor)
+        response = self.guest_client.get(
+            reverse('posts:index') + f'?before={paginator.previous_cursor}'
+        )
+        self.assertEqual(list(response.context.get('page_obj')), first_page)
+
+    def test_broken_cursor_returns_first_page(self):
+        response = self.guest_client.get(reverse('posts:index') + '?after=!!')
+        self.assertEqual(len(response.context.get('page_obj')),
+                         settings.NUMBER_OF_POSTS_PER_PAGE)
+
+
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feed_entries_follow_the_graph(self):
+        """Лента дополняется при подписке и новом посте,
+           очищается при отписке."""
+        old_post = Post.objects.create(text='Старый пост', author=self.author)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(
+            set(FeedEntry.objects.filter(user=self.reader)
+                .values_list('post', flat=True)),
+            {old_post.pk, new_post.pk}
+        )
+        follow.delete()
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+
+    def test_follow_index_pages_by_feed_entries(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        for i in range(settings.NUMBER_OF_POSTS_PER_PAGE + 1):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        page_obj = response.context.get('page_obj')
+        self.assertEqual(len(page_obj), settings.NUMBER_OF_POSTS_PER_PAGE)
+        response = self.reader_client.get(
+            reverse('posts:follow_index')
+            + f'?after={page_obj.paginator.next_cursor}'
+        )
+        self.assertEqual(len(response.context.get('page_obj')), 1)
+
+    @override_settings(FEED_PUSH_MAX_FOLLOWERS=1)
+    def test_follow_index_merges_pulled_authors(self):
+        """Посты авторов с множеством подписчиков не раскладываются,
+           а подмешиваются в ленту при чтении."""
+        cache.clear()
+        star = User.objects.create(username='star')
+        fan = User.objects.create(username='fan')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=star)
+        Follow.objects.create(user=fan, author=star)
+        posts = [
+            Post.objects.create(text=f'Пост {i}',
+                                author=star if i % 2 else self.author)
+            for i in range(4)
+        ]
+        self.assertFalse(FeedEntry.objects.filter(post__author=star).exists())
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context.get('page_obj')),
+                         posts[::-1])
+
+    @override_settings(FEED_PUSH_MAX_FOLLOWERS=1)
+    def test_unfollow_does_not_push_pulled_author(self):
+        """Автор, у которого подписчиков снова стало мало, остаётся
+           на чтении при запросе: отписка ничего не раскладывает."""
+        cache.clear()
+        star = User.objects.create(username='star')
+        fan = User.objects.create(username='fan')
+        Follow.objects.create(user=self.reader, author=star)
+        Follow.objects.create(user=fan, author=star)
+        post = Post.objects.create(text='Пост', author=star)
+        Follow.objects.get(user=fan, author=star).delete()
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context.get('page_obj')), [post])
+
+    @override_settings(FEED_PUSH_MAX_FOLLOWERS=0)
+    def test_pulled_authors_are_read_in_one_query(self):
+        """Число запросов ленты не растёт с числом авторов на чтении."""
+        cache.clear()
+
+        def follow_star(number):
+            star = User.objects.create(username=f'star{number}')
+            Follow.objects.create(user=self.reader, author=star)
+            return Post.objects.create(text=f'Пост {number}', author=star)
+
+        def read_feed():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.reader_client.get(
+                    reverse('posts:follow_index')
+                )
+            return response, len(queries)
+
+        posts = [follow_star(number) for number in range(2)]
+        response, first = read_feed()
+        posts += [follow_star(number) for number in range(2, 5)]
+        response, second = read_feed()
+        self.assertEqual(first, second)
+        self.assertEqual(list(response.context.get('page_obj')),
+                         posts[::-1])
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': query, **params})
+        return response.context['page_obj']
+
+    def test_results_are_ranked_with_snippets(self):
+        """Выдача упорядочена по релевантности, совпадения выделены."""
+        Post.objects.create(text='Кот <b>спит</b>', author=self.author)
+        best = Post.objects.create(text='Кот и кот', author=self.author)
+        Post.objects.create(text='Собака', author=self.author)
+        page_obj = self.search('кот')
+        self.assertIsInstance(page_obj, Page)
+        self.assertEqual(page_obj.paginator.count, 2)
+        self.assertEqual(page_obj[0], best)
+        self.assertEqual(page_obj[1].snippet,
+                         '<mark>Кот</mark> &lt;b&gt;спит&lt;/b&gt;')
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.create(text='Старый текст', author=self.author)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(self.search('старый').paginator.count, 0)
+        self.assertEqual(list(self.search('новый')), [post])
+        post.delete()
+        self.assertEqual(self.search('новый').paginator.count, 0)
+
+    def test_pages_keep_query(self):
+        for i in range(settings.NUMBER_OF_POSTS_PER_PAGE + 1):
+            Post.objects.create(text=f'Слово {i}', author=self.author)
+        response = self.client.get(reverse('posts:search'), {'q': 'слово'})
+        self.assertContains(response, 'href="?q=%D1%81%D0%BB%D0%BE%D0%B2%D0'
+                                      '%BE&amp;page=2"')
+        self.assertEqual(len(self.search('слово', page=2)), 1)
+
+    def test_admin_search_uses_index(self):
+        post = Post.objects.create(text='Редкое слово', author=self.author)
+        Post.objects.create(text='Обычный пост', author=self.author)
+        queryset, distinct = admin.site._registry[Post].get_search_results(
+            None, Post.objects.all(), 'редк'
+        )
+        self.assertEqual(list(queryset), [post])
+        self.assertIn('posts_post_fts', str(queryset.query))
+
+    def test_filter_returns_every_match(self):
+        posts = [Post.objects.create(text=f'Мир номер {i}', author=self.author)
+                 for i in range(5)]
+        Post.objects.create(text='Обычный пост', author=self.author)
+        queryset = get_backend().filter(Post.objects.all(), 'мир')
+        self.assertEqual(set(queryset), set(posts))
+        self.assertEqual(queryset.count(), get_backend().count('мир'))
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.posts = [
+            Post.objects.create(text=f'Пост {i}', author=cls.author,
+                                group=cls.group)
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages_with_sparse_fields(self):
+        url = reverse('posts:api_index')
+        data = self.client.get(url, {'limit': 2, 'fields': 'id,group'}).json()
+        self.assertEqual(data['results'], [
+            {'id': self.posts[2].pk, 'group': 'group'},
+            {'id': self.posts[1].pk, 'group': 'group'},
+        ])
+        self.assertIsNone(data['previous'])
+        data = self.client.get(url, {'after': data['next']}).json()
+        self.assertEqual([post['id'] for post in data['results']],
+                         [self.posts[0].pk])
+        self.assertEqual(data['results'][0]['author'], 'author')
+        self.assertIsNone(data['next'])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('posts:api_index'),
+                                   {'fields': 'id,password'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_etag_answers_without_queries(self):
+        """Повторный опрос с ETag не трогает базу, пока лента не менялась."""
+        url = reverse('posts:api_group_posts', args=[self.group.slug])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(text='Новый', author=self.author,
+                            group=self.group)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_new_comment_changes_etag(self):
+        """comment_count входит в ответ, поэтому комментарий меняет ETag
+           всех лент с этим постом."""
+        urls = [
+            reverse('posts:api_index'),
+            reverse('posts:api_group_posts', args=[self.group.slug]),
+            reverse('posts:api_profile', args=[self.author.username]),
+        ]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        Comment.objects.create(post=self.posts[0], author=self.author,
+                               text='Комментарий')
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                counts = {post['id']: post['comment_count']
+                          for post in response.json()['results']}
+                self.assertEqual(counts[self.posts[0].pk], 1)
+
+    def test_follow_feed(self):
+        reader = User.objects.create(username='reader')
+        url = reverse('posts:api_follow_index')
+        self.assertEqual(self.client.get(url).status_code,
+                         HTTPStatus.UNAUTHORIZED)
+        Follow.objects.create(user=reader, author=self.author)
+        self.client.force_login(reader)
+        response = self.client.get(url, {'fields': 'id'})
+        self.assertEqual(response.json()['results'],
+                         [{'id': post.pk} for post in self.posts[::-1]])
+        response = self.client.get(url, {'fields': 'id'},
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_missing_profile(self):
+        response = self.client.get(reverse('posts:api_profile',
+                                           args=['nobody']))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class ExportViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        Post.objects.create(text='Чужой пост', author=cls.reader)
+        Comment.objects.create(post=cls.post, author=cls.reader,
+                               text='Комментарий')
+
+    def test_export_streams_own_posts(self):
+        url = reverse('posts:export')
+        self.assertRedirects(self.client.get(url),
+                             f'{reverse("users:login")}?next={url}')
+        self.client.force_login(self.author)
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        self.assertIn('author-posts.jsonl.gz',
+                      response['Content-Disposition'])
+        lines = gzip.decompress(
+            b''.join(response.streaming_content)
+        ).decode().splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual([record['type'] for record in records],
+                         ['post', 'comment'])
+        self.assertEqual(records[0]['id'], self.post.pk)
+        self.assertEqual(records[1]['author'], 'reader')
@@ -0,0 +1,220 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from .storage import post_image_storage
+from .versions import bump_versions
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _init_worker(settings_module, overrides):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    # воркер запускается через spawn и читает настройки заново,
+    # поэтому хранилище и БД передаются ему такими, какие они у родителя
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    import django
+    django.setup()
+
+
+def thumbnail_geometries():
+    """Варианты из THUMBNAIL_GEOMETRIES, которые умеет кодировать Pillow.
+
+    Сборка Pillow без libwebp не пишет WebP, тогда остаются только
+    запасные форматы.
+    """
+    from PIL import features
+
+    return [(geometry, options)
+            for geometry, options in settings.THUMBNAIL_GEOMETRIES
+            if options.get('format') != 'WEBP' or features.check('webp')]
+
+
+def variant_key(geometry, options):
+    return geometry, options.get('format', 'JPEG')
+
+
+def variant_size(geometry, options, width, height):
+    """Размер миниатюры картинки width x height, как его получит sorl.
+
+    Повторяет масштабирование и обрезку движка, поэтому шаблону не нужно
+    читать размеры готовых миниатюр.
+    """
+    from sorl.thumbnail.conf import settings as sorl_settings
+    from sorl.thumbnail.helpers import toint
+    from sorl.thumbnail.parsers import parse_geometry
+
+    box = parse_geometry(geometry, width / height)
+    crop = options.get('crop')
+    factors = (box[0] / width, box[1] / height)
+    factor = max(factors) if crop else min(factors)
+    upscale = options.get('upscale', sorl_settings.THUMBNAIL_UPSCALE)
+    if factor < 1 or upscale:
+        width, height = toint(width * factor), toint(height * factor)
+    if crop and crop != 'noop':
+        width, height = min(width, box[0]), min(height, box[1])
+    return width, height
+
+
+def make_thumbnails(name):
+    """Создаёт все миниатюры картинки, которые выводят шаблоны."""
+    from sorl.thumbnail import get_thumbnail
+    from sorl.thumbnail.images import ImageFile
+
+    # ключи миниатюр зависят от хранилища источника, оно должно быть
+    # тем же, что у поля Post.image
+    source = ImageFile(name, post_image_storage)
+    for geometry, options in thumbnail_geometries():
+        get_thumbnail(source, geometry, **options)
+    bump_image_versions(name)
+    return name
+
+
+def bump_image_versions(name):
+    """Сбрасывает закэшированные страницы постов с этой картинкой.
+
+    Пока миниатюр не было, страницы рисовали вместо картинки заглушку.
+    """
+    # модуль грузит воркер пула до django.setup(), модели - только здесь
+    from .models import Post
+
+    scopes = {('index',)}
+    for pk, author_id, group_id in Post.objects.filter(
+            image=name).values_list('pk', 'author_id', 'group_id'):
+        scopes.update({('post', pk), ('author', author_id)})
+        if group_id is not None:
+            scopes.add(('group', group_id))
+    bump_versions(*scopes)
+
+
+def thumbnail_name(source, geometry, options):
+    """Имя файла миниатюры, как его вычисляет ThumbnailBackend."""
+    from sorl.thumbnail import default
+    from sorl.thumbnail.conf import defaults
+    from sorl.thumbnail.conf import settings as sorl_settings
+
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(defaults, attr):
+            options.setdefault(key, value)
+    return backend._get_thumbnail_filename(source, geometry, options)
+
+
+def prefetch_thumbnails(posts):
+    """Достаёт миниатюры всех постов страницы одним get_many.
+
+    Промахи кэша дочитываются из таблицы хранилища одним запросом.
+    Найденные миниатюры кладутся в post.thumbnails по (геометрия, формат),
+    тег post_picture берёт их оттуда без обращения к хранилищу.
+    """
+    from sorl.thumbnail import default
+    from sorl.thumbnail.conf import settings as sorl_settings
+    from sorl.thumbnail.images import ImageFile, deserialize_image_file
+    from sorl.thumbnail.kvstores.base import add_prefix
+    from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+    from sorl.thumbnail.models import KVStore
+
+    keys = {}
+    for post in posts:
+        post.thumbnails = {}
+        if not post.image:
+            continue
+        source = ImageFile(post.image)
+        for geometry, options in thumbnail_geometries():
+            name = thumbnail_name(source, geometry, options)
+            # одна картинка может быть у нескольких постов
+            keys.setdefault(
+                add_prefix(ImageFile(name, default.storage).key), []
+            ).append((post, variant_key(geometry, options)))
+    if not keys:
+        return posts
+    kv_cache = default.kvstore.cache
+    values = kv_cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(KVStore.objects.filter(key__in=missing)
+                     .values_list('key', 'value'))
+        # как и сам sorl, запоминаем отсутствие, чтобы не ходить в БД снова
+        found.update((key, EMPTY_VALUE) for key in missing
+                     if key not in found)
+        kv_cache.set_many(found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    for key, value in values.items():
+        # пустое значение кэш хранит для миниатюр, которых ещё нет
+        if value and value != EMPTY_VALUE:
+            thumbnail = deserialize_image_file(value)
+            for post, variant in keys[key]:
+                post.thumbnails[variant] = thumbnail
+    return posts
+
+
+def post_thumbnails(post):
+    """Готовые варианты картинки поста по (геометрия, формат).
+
+    Берутся из prefetch_thumbnails. Недостающие в запросе не создаются:
+    их делает фоновый пул, а до тех пор шаблон рисует заглушку.
+    """
+    if not hasattr(post, 'thumbnails'):
+        # пост вне списка, как в post_detail: все варианты одним запросом
+        prefetch_thumbnails([post])
+    return post.thumbnails
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error('Не удалось обработать картинку',
+                     exc_info=future.exception())
+
+
+def make_executor(max_workers):
+    """Пул процессов с настроенным Django, как у текущего процесса."""
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(
+            os.environ['DJANGO_SETTINGS_MODULE'],
+            {'MEDIA_ROOT': settings.MEDIA_ROOT,
+             'DATABASES': settings.DATABASES},
+        ),
+    )
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = make_executor(settings.THUMBNAIL_WORKERS)
+    return _executor
+
+
+def process_image(name):
+    """Пережимает загруженную картинку и создаёт её миниатюры."""
+    from .images import ingest_image
+
+    return make_thumbnails(ingest_image(name))
+
+
+def schedule_image_processing(name):
+    """Отдаёт обработку загруженной картинки фоновому пулу процессов.
+
+    При THUMBNAIL_WORKERS = 0 картинка обрабатывается сразу в текущем
+    процессе, это удобно в тестах и management-командах.
+    """
+    if not settings.THUMBNAIL_WORKERS:
+        process_image(name)
+        return
+    get_executor().submit(process_image, name).add_done_callback(
+        _log_failure
+    )
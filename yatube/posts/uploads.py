@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.template.defaultfilters import filesizeformat
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    """Обрывает приём файла, как только он превысил POST_IMAGE_MAX_BYTES.
+
+    Стоит первым в FILE_UPLOAD_HANDLERS: остаток файла уже не пишется
+    ни в память, ни на диск. Ошибка сохраняется в request.upload_errors,
+    откуда её берёт форма.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        limit = settings.POST_IMAGE_MAX_BYTES
+        if self.received > limit:
+            if not hasattr(self.request, 'upload_errors'):
+                self.request.upload_errors = {}
+            self.request.upload_errors[self.field_name] = (
+                f'Файл больше {filesizeformat(limit)}'
+            )
+            raise SkipFile
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
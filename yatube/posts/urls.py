@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'posts'
 
@@ -13,7 +13,17 @@ urlpatterns = [
     path('posts/<post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
+    path('posts/<int:post_id>/comments/', views.comments_since,
+         name='comments_since'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search, name='search'),
+    path('export/', views.export, name='export'),
+    path('api/v1/posts/', api.index, name='api_index'),
+    path('api/v1/groups/<slug:slug>/posts/', api.group_posts,
+         name='api_group_posts'),
+    path('api/v1/users/<str:username>/posts/', api.profile,
+         name='api_profile'),
+    path('api/v1/follow/posts/', api.follow_index, name='api_follow_index'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
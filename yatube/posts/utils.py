@@ -1,9 +1,147 @@
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from itertools import islice
+
 from django.conf import settings
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def row_key(row, date_field='pub_date'):
+    """(дата, pk) объекта модели или словаря из values()."""
+    if isinstance(row, dict):
+        return row[date_field], row['id']
+    return getattr(row, date_field), row.pk
+
+
+def encode_cursor(row, date_field='pub_date'):
+    date, pk = row_key(row, date_field)
+    raw = f'{date.isoformat()}|{pk}'.encode()
+    return urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (дата, pk) из токена или None, если токен битый."""
+    if not token:
+        return None
+    try:
+        raw = urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который берёт число объектов у счётчика из кэша."""
+
+    def __init__(self, object_list, per_page, count=None):
+        super().__init__(object_list, per_page)
+        self.count_func = count
+
+    @cached_property
+    def count(self):
+        if self.count_func is None:
+            return super().count
+        return self.count_func()
+
+
+def seek(queryset, cursor, newer, pk_field='pk', date_field='pub_date'):
+    """Отбирает строки за курсором в порядке обхода от него."""
+    if newer:
+        ordering = (date_field, pk_field)
+        lookup = 'gt'
+    else:
+        ordering = (f'-{date_field}', f'-{pk_field}')
+        lookup = 'lt'
+    if cursor:
+        date, pk = cursor
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__{lookup}': date})
+            | Q(**{date_field: date, f'{pk_field}__{lookup}': pk})
+        )
+    return queryset.order_by(*ordering)
+
+
+def comments_after(post, cursor, limit):
+    """Комментарии поста за курсором (created, id) и курсор следующей
+    порции, если она есть."""
+    comments = list(seek(post.comments.select_related('author'), cursor,
+                         True, date_field='created')[:limit + 1])
+    if len(comments) <= limit:
+        return comments, None
+    comments = comments[:limit]
+    return comments, encode_cursor(comments[-1], 'created')
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу (pub_date, id) без OFFSET и COUNT(*).
+
+    Страница выбирается токенами ``after`` (более старые посты) и
+    ``before`` (более новые), ссылки на соседние страницы доступны
+    в ``next_cursor`` и ``previous_cursor``.
+    """
+
+    # шаблон не спрашивает у такой страницы число страниц: это COUNT(*)
+    uses_cursors = True
+
+    def __init__(self, object_list, per_page, after=None, before=None):
+        super().__init__(object_list, per_page)
+        self.after = decode_cursor(after)
+        self.before = None if self.after else decode_cursor(before)
+        self.next_cursor = None
+        self.previous_cursor = None
+
+    def get_rows(self, cursor, newer, limit):
+        return list(seek(self.object_list, cursor, newer)[:limit])
+
+    def get_page(self, number=None):
+        newer = self.before is not None
+        rows = self.get_rows(self.before or self.after, newer,
+                             self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if newer:
+            rows.reverse()
+            has_newer, has_older = has_more, bool(rows)
+        else:
+            has_newer, has_older = bool(self.after), has_more
+        if rows and has_newer:
+            self.previous_cursor = encode_cursor(rows[0])
+        if rows and has_older:
+            self.next_cursor = encode_cursor(rows[-1])
+        return self._get_page(rows, 1, self)
 
 
-def my_paginator(posts, request):
-    paginator = Paginator(posts, settings.NUMBER_OF_POSTS_PER_PAGE)
+def my_paginator(posts, request, count=None,
+                 cursor_paginator=CursorPaginator):
+    after = request.GET.get('after')
+    before = request.GET.get('before')
     page_number = request.GET.get('page')
+    # старые ссылки вида ?page=N продолжают работать через OFFSET
+    if after or before or (settings.PAGINATION_MODE == 'cursor'
+                           and not page_number):
+        paginator = cursor_paginator(posts,
+                                     settings.NUMBER_OF_POSTS_PER_PAGE,
+                                     after=after, before=before)
+    else:
+        paginator = CachedCountPaginator(
+            posts, settings.NUMBER_OF_POSTS_PER_PAGE, count=count
+        )
     page_obj = paginator.get_page(page_number)
     return page_obj
@@ -0,0 +1,41 @@
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'posts:version:{scope}:{pk}'
+
+
+def version_key(scope, pk=''):
+    return VERSION_KEY.format(scope=scope, pk=pk)
+
+
+def get_versions(*scopes):
+    """Возвращает поколения областей кэша строкой для ключа фрагмента.
+
+    Новое поколение начинается с текущего времени, поэтому после
+    вытеснения счётчика из кэша старые фрагменты не оживают.
+    """
+    keys = [version_key(*scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, int(time.time() * 1000), None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump_versions(*scopes):
+    for scope in scopes:
+        try:
+            cache.incr(version_key(*scope))
+        except ValueError:
+            pass
+
+
+def comment_scopes(author_id, group_id):
+    """Области списков, где виден comment_count поста: HTML-ленты его
+    не выводят, поэтому у JSON API для них отдельные поколения."""
+    scopes = [('index_comments',), ('author_comments', author_id)]
+    if group_id is not None:
+        scopes.append(('group_comments', group_id))
+    return scopes
@@ -1,35 +1,89 @@
+from functools import partial
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.http import (HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
 
+from . import counts
+from .decorators import cache_anonymous_page
+from .exporter import gzip_chunks, jsonl_lines, user_records
+from .feed import FeedPaginator
 from .forms import CommentForm, PostForm
+from .images import METADATA_FIELDS
 from .models import Group, Follow, Post, User
-from .utils import my_paginator
+from .search import get_backend
+from .utils import comments_after, decode_cursor, my_paginator
+from .versions import get_versions
+
+
+def index_scopes():
+    return [('index',)]
+
+
+def group_scopes(slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    if group_id is None:
+        return None
+    return [('group', group_id), ('users',)]
+
 
+def profile_scopes(username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    if author_id is None:
+        return None
+    return [('author', author_id), ('groups',)]
 
+
+def post_scopes(post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True).first()
+    if author_id is None:
+        return None
+    return [('post', post_id), ('author', author_id), ('groups',),
+            ('users',)]
+
+
+@cache_anonymous_page(index_scopes)
 def index(request):
     posts_list = Post.objects.select_related('group', 'author')
-    page_obj = my_paginator(posts_list, request)
+    page_obj = my_paginator(posts_list, request,
+                            count=counts.all_posts_count)
     context = {
         'page_obj': page_obj,
+        'cache_version': get_versions(('index',)),
+        'cache_timeout': settings.PAGE_FRAGMENT_TIMEOUT,
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_anonymous_page(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts_list = group.posts.select_related('author')
-    page_obj = my_paginator(posts_list, request)
+    page_obj = my_paginator(posts_list, request,
+                            count=partial(counts.group_posts_count, group))
     context = {
         'group': group,
         'page_obj': page_obj,
+        'cache_version': get_versions(('group', group.pk), ('users',)),
+        'cache_timeout': settings.PAGE_FRAGMENT_TIMEOUT,
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_anonymous_page(profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
     posts_list = author.posts.select_related('group')
-    page_obj = my_paginator(posts_list, request)
+    page_obj = my_paginator(posts_list, request,
+                            count=partial(counts.author_posts_count, author))
     following = (request.user.is_authenticated and request.user != author
                  and Follow.objects.filter(author=author,
                                            user=request.user).exists())
@@ -37,26 +91,74 @@ def profile(request, username):
         'page_obj': page_obj,
         'author': author,
         'following': following,
+        'cache_version': get_versions(('author', author.pk), ('groups',)),
+        'cache_timeout': settings.PAGE_FRAGMENT_TIMEOUT,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@cache_anonymous_page(post_scopes)
 def post_detail(request, post_id):
     form = CommentForm()
-    post = get_object_or_404(Post.objects.select_related('author', 'group'),
-                             pk=post_id)
-    comments = post.comments.select_related('author')
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'author__stats', 'group'),
+        pk=post_id
+    )
+    comments, comments_next = comments_after(
+        post, decode_cursor(request.GET.get('comments_after')),
+        settings.COMMENTS_PER_PAGE
+    )
     context = {
         'post': post,
         'form': form,
-        'comments': comments
+        'comments': comments,
+        'comments_next': comments_next,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def comments_since(request, post_id):
+    """Комментарии новее указанного id: HTML-фрагмент или JSON.
+
+    Кривой since - ошибка клиента. Id, которого нет у этого поста,
+    не откатывает клиента к самым старым комментариям: ответ пустой.
+    """
+    post = get_object_or_404(Post, pk=post_id)
+    since = request.GET.get('since')
+    if since is not None and not since.isdigit():
+        return HttpResponseBadRequest('Некорректный параметр since')
+    comments, next_cursor = [], None
+    if since is None:
+        comments, next_cursor = comments_after(post, None,
+                                               settings.COMMENTS_PER_PAGE)
+    else:
+        created = post.comments.filter(pk=since).values_list(
+            'created', flat=True).first()
+        if created is not None:
+            comments, next_cursor = comments_after(
+                post, (created, int(since)), settings.COMMENTS_PER_PAGE
+            )
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments
+            ],
+            'has_more': next_cursor is not None,
+        })
+    return render(request, 'includes/comment_list.html',
+                  {'comments': comments})
+
+
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None, files=request.FILES or None)
+    form = PostForm(request.POST or None, files=request.FILES or None,
+                    upload_errors=getattr(request, 'upload_errors', None))
     if not form.is_valid():
         return render(request, 'posts/create_post.html', {'form': form})
     post = form.save(commit=False)
@@ -71,14 +173,17 @@ def post_edit(request, post_id):
     if post.author != request.user:
         return redirect('posts:post_detail', post_id)
     form = PostForm(request.POST or None, files=request.FILES or None,
-                    instance=post)
+                    instance=post,
+                    upload_errors=getattr(request, 'upload_errors', None))
     if not form.is_valid():
         return render(request,
                       'posts/create_post.html',
                       context={'post': post,
                                'form': form,
                                'is_edit': True})
-    form.save()
+    post = form.save(commit=False)
+    # comment_count меняется через F() и не должен перезаписываться
+    post.save(update_fields=PostForm.Meta.fields + METADATA_FIELDS)
     return redirect('posts:post_detail', post_id)
 
 
@@ -99,13 +204,30 @@ def follow_index(request):
     posts_list = Post.objects.filter(
         author__following__user=request.user).select_related('author',
                                                              'group')
-    page_obj = my_paginator(posts_list, request)
+    page_obj = my_paginator(posts_list, request,
+                            count=partial(counts.feed_posts_count,
+                                          request.user),
+                            cursor_paginator=partial(FeedPaginator,
+                                                     user=request.user))
     context = {
         'page_obj': page_obj
     }
     return render(request, "posts/follow.html", context)
 
 
+def search(request):
+    """Поиск по тексту постов, выдача упорядочена по релевантности."""
+    query = request.GET.get('q', '').strip()
+    results = get_backend().search(query) if query else []
+    paginator = Paginator(results, settings.NUMBER_OF_POSTS_PER_PAGE)
+    context = {
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('page')),
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
@@ -119,3 +241,20 @@ def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.get(user=request.user, author=author).delete()
     return redirect('posts:follow_index')
+
+
+@login_required
+def export(request):
+    """Посты пользователя с комментариями одним gzip-файлом JSONL.
+
+    Файл собирается по мере отдачи, поэтому память не растёт
+    с числом постов.
+    """
+    response = StreamingHttpResponse(
+        gzip_chunks(jsonl_lines(user_records(request.user))),
+        content_type='application/gzip'
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{request.user.username}-posts.jsonl.gz"'
+    )
+    return response
@@ -134,6 +134,23 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
 NUMBER_OF_POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 50
+
+# 'cursor' - пагинация по ключу (pub_date, id), 'page' - по номеру страницы
+PAGINATION_MODE = 'cursor'
+
+# до этого порога число постов считается точно, дальше - оценкой
+POSTS_COUNT_EXACT_LIMIT = 10000
+
+# размер пачки при записи материализованной ленты подписок
+FEED_BATCH_SIZE = 1000
+# посты авторов с большим числом подписчиков не раскладываются по лентам,
+# а подмешиваются при чтении
+FEED_PUSH_MAX_FOLLOWERS = 10000
+
+# сколько строк выгрузка читает из базы за один запрос
+EXPORT_CHUNK_SIZE = 2000
+
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -147,8 +164,103 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# ширины картинки поста для srcset, высота держит пропорцию 960x339;
+# первый формат - основной для <picture>, последний - запасной для <img>
+THUMBNAIL_WIDTHS = (480, 720, 960)
+THUMBNAIL_FORMATS = ('WEBP', 'JPEG')
+# миниатюры, которые выводят шаблоны; создаются заранее при загрузке
+THUMBNAIL_GEOMETRIES = tuple(
+    (f'{width}x{width * 339 // 960}',
+     {'crop': 'center', 'upscale': True, 'format': image_format})
+    for image_format in THUMBNAIL_FORMATS
+    for width in THUMBNAIL_WIDTHS
+)
+# 0 - обрабатывать картинки в процессе запроса, без фонового пула
+THUMBNAIL_WORKERS = 2
+
+# ограничения на загружаемые картинки постов: вес проверяется по ходу
+# приёма, число пикселей - по заголовку, до распаковки
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+# большая сторона картинки после пережатия в фоне
+POST_IMAGE_MAX_SIDE = 2048
+
+# наибольший размер страницы JSON API (параметр limit)
+API_MAX_PAGE_SIZE = 100
+
+# поиск по постам; без SQLite FTS5 - posts.search.ContainsBackend
+POSTS_SEARCH_BACKEND = 'posts.search.SqliteFtsBackend'
+
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.LimitedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# поколения фрагментов и счётчики постов меняются в кэше того процесса,
+# который принял запись; общий memcached видят все воркеры и пул
+# миниатюр, поэтому кэшированное может жить часами
+MEMCACHED_LOCATION = os.getenv('MEMCACHED_LOCATION')
+if MEMCACHED_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': MEMCACHED_LOCATION,
+        }
     }
+    POSTS_COUNT_TIMEOUT = 60 * 60
+    # фрагменты страниц-лент в шаблонах и целые страницы для анонимов
+    PAGE_FRAGMENT_TIMEOUT = 60 * 60 * 6
+    ANONYMOUS_PAGE_TIMEOUT = 60 * 60 * 6
+    POST_FRAGMENT_TIMEOUT = 60 * 60 * 24
+else:
+    # у каждого процесса свой кэш и чужих записей он не видит:
+    # устаревшая страница держится не дольше минуты
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+    POSTS_COUNT_TIMEOUT = 60
+    PAGE_FRAGMENT_TIMEOUT = 60
+    ANONYMOUS_PAGE_TIMEOUT = 60
+    POST_FRAGMENT_TIMEOUT = 60
+
+TEST_RUNNER = 'core.query_budgets.QueryBudgetTestRunner'
+# сколько SQL-запросов может сделать страница при пустом кэше: число
+# или {размер страницы: число}; у авторизованного пользователя два из
+# них - чтение сессии и самого пользователя
+QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:group_posts': 5,
+    'posts:profile': 6,
+    'posts:post_detail': 5,
+    'posts:post_create': 8,
+    'posts:post_edit': 9,
+    'posts:add_comment': 5,
+    'posts:comments_since': 3,
+    'posts:follow_index': 6,
+    'posts:search': 5,
+    'posts:export': 6,
+    'posts:api_index': 1,
+    'posts:api_group_posts': 3,
+    'posts:api_profile': 3,
+    'posts:api_follow_index': 5,
+    'posts:profile_follow': 10,
+    'posts:profile_unfollow': 8,
+    'users:signup': 4,
+    'users:logout': 4,
+    'users:login': 5,
+    'users:password_change': 2,
+    'users:password_change_done': 2,
+    'users:password_reset': 0,
+    'users:password_reset_done': 0,
+    'users:password_reset_confirm': 3,
+    'users:password_reset_complete': 0,
+    'about:author': 2,
+    'about:tech': 2,
 }
+# не входят в бюджет: управление транзакцией
+QUERY_BUDGET_IGNORE = [
+    r'^(RELEASE )?SAVEPOINT ',
+]